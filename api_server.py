@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+只读JSON/HTTP接口，直接读取SQLite数据库，供其他工具程序化访问
+
+启动:  python api_server.py --port 8765
+
+GET /rooms[?gid=]                               房间目录
+GET /availability?date=YYYY-MM-DD[&gid=]        某天所有房间的时间槽
+GET /free?from=YYYY-MM-DD HH:MM&to=...[&gid=]   整段时间都可预约的房间
+GET /healthz                                    数据库版本
+GET /ics/room-<space_id>.ics, /ics/gid-<gid>.ics  空闲时段的iCalendar订阅源 (ics_export.py生成)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from db_pool import ReadPool
+from ics_export import DEFAULT_OUTPUT_DIR as DEFAULT_ICS_DIR, IcsExporter
+from room_catalog import get_room_catalog
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+
+# 缓存的响应数量 (数据库版本变化后旧响应自动失效)
+RESPONSE_CACHE_SIZE = 512
+# 多久检查一次数据库版本 (秒)
+VERSION_POLL_INTERVAL = 1.0
+# 最长的时间槽，/free按它往前多查一段，找到开始于from之前的时间槽
+SLOT_LOOKBACK = timedelta(days=1)
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+
+
+class ReadConnectionPool:
+    """db_pool.ReadPool的只读连接，查询在线程池中执行，不阻塞事件循环"""
+
+    def __init__(self, db_name=DEFAULT_DB, size=4):
+        self.db_name = db_name
+        self._pool = ReadPool(db_name, size)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='api-db')
+
+    def run(self, query, *args):
+        with self._pool.connection() as conn:
+            return query(conn, *args)
+
+    async def execute(self, query, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.run, query, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._pool.close()
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def parse_datetime(value):
+    """接受 'YYYY-MM-DD HH:MM' 或 'YYYY-MM-DDTHH:MM' (可带秒)"""
+    value = value.replace('T', ' ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f'invalid datetime: {value}')
+
+
+def get_param(params, name, parser=str, required=False):
+    values = params.get(name)
+    if not values:
+        if required:
+            raise ValueError(f'missing parameter: {name}')
+        return None
+    return parser(values[0])
+
+
+def query_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def query_rooms(conn, params):
+    gid = get_param(params, 'gid', int)
+    catalog = get_room_catalog()
+    records = catalog.rooms_for_gid(gid) if gid is not None else list(catalog)
+    return [
+        {'space_id': r.space_id, 'room_name': r.room_name, 'gid': r.gid, 'capacity': r.capacity, 'url': r.url}
+        for r in sorted(records, key=lambda r: r.space_id)
+    ]
+
+
+def query_availability(conn, params):
+    day = get_param(params, 'date', parse_date, required=True)
+    gid = get_param(params, 'gid', int)
+    sql = '''
+        SELECT ts.space_id, ts.start_time, ts.end_time, ts.status
+        FROM time_slots ts
+        JOIN rooms r ON ts.space_id = r.space_id
+        WHERE ts.start_time >= ? AND ts.start_time < ?
+    '''
+    args = [day.strftime('%Y-%m-%d'), (day + timedelta(days=1)).strftime('%Y-%m-%d')]
+    if gid is not None:
+        sql += ' AND r.gid = ?'
+        args.append(gid)
+    sql += ' ORDER BY ts.space_id, ts.start_time'
+
+    catalog = get_room_catalog()
+    rooms = OrderedDict()
+    for space_id, start_time, end_time, status in conn.execute(sql, args):
+        room = rooms.get(space_id)
+        if room is None:
+            record = catalog.get(space_id)
+            room = rooms[space_id] = {
+                'space_id': space_id,
+                'room_name': record.room_name if record else f'Room {space_id}',
+                'slots': [],
+            }
+        room['slots'].append([start_time, end_time, status])
+    return {'date': args[0], 'gid': gid, 'rooms': list(rooms.values())}
+
+
+def query_free(conn, params):
+    start = get_param(params, 'from', parse_datetime, required=True)
+    end = get_param(params, 'to', parse_datetime, required=True)
+    gid = get_param(params, 'gid', int)
+    if end <= start:
+        raise ValueError('"to" must be after "from"')
+
+    # 与时间段重叠的时间槽 (包括开始于from之前的) 必须全部可用，并且裁剪到时间段内后覆盖整段时间；
+    # start_time的下界只是让查询走索引，时间槽不会长于SLOT_LOOKBACK
+    start_text, end_text = start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+    sql = '''
+        SELECT ts.space_id
+        FROM time_slots ts
+        JOIN rooms r ON ts.space_id = r.space_id
+        WHERE ts.start_time >= ? AND ts.start_time < ? AND ts.end_time > ?
+    '''
+    args = [(start - SLOT_LOOKBACK).strftime('%Y-%m-%d %H:%M:%S'), end_text, start_text]
+    if gid is not None:
+        sql += ' AND r.gid = ?'
+        args.append(gid)
+    sql += '''
+        GROUP BY ts.space_id
+        HAVING SUM(ts.status != 'available') = 0
+           AND SUM((julianday(MIN(ts.end_time, ?)) - julianday(MAX(ts.start_time, ?))) * 1440) >= ?
+        ORDER BY ts.space_id
+    '''
+    args += [end_text, start_text, (end - start).total_seconds() / 60 - 0.5]
+
+    catalog = get_room_catalog()
+    rooms = []
+    for (space_id,) in conn.execute(sql, args):
+        record = catalog.get(space_id)
+        rooms.append({
+            'space_id': space_id,
+            'room_name': record.room_name if record else f'Room {space_id}',
+            'gid': record.gid if record else None,
+            'url': f'https://libcal.library.utoronto.ca/space/{space_id}?date={start:%Y-%m-%d}',
+        })
+    return {'from': start_text, 'to': end_text, 'gid': gid, 'rooms': rooms}
+
+
+ROUTES = {
+    '/rooms': query_rooms,
+    '/availability': query_availability,
+    '/free': query_free,
+}
+
+
+class AvailabilityAPI:
+    """HTTP/1.1 keep-alive服务，响应按数据库版本缓存并带ETag"""
+
+    def __init__(self, db_name=DEFAULT_DB, pool_size=4, ics_dir=DEFAULT_ICS_DIR):
+        self.pool = ReadConnectionPool(db_name, pool_size)
+        try:
+            self.version = self.pool.run(query_version)
+        except sqlite3.Error as e:
+            # 数据库还没有创建或暂时打不开也照常启动，/healthz报告version为null，之后轮询到时自动接上
+            print(f"Failed to read DB version: {e}")
+            self.version = None
+        self._cache = OrderedDict()
+        self.ics = IcsExporter(db_name, ics_dir)
+        # 订阅源文件名 -> (校验和, 内容)
+        self._ics_bodies = {}
+
+    async def export_ics(self):
+        """数据库版本变化后增量重新生成iCalendar订阅源 (在线程池中执行)"""
+        if self.ics.version == self.version:
+            return
+        try:
+            stats = await asyncio.get_running_loop().run_in_executor(None, self.ics.export)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Failed to export iCalendar feeds: {e}")
+            return
+        print(f"Regenerated {stats['written']} of {stats['feeds']} iCalendar feeds in {stats['seconds']:.3f}s "
+              f"(version {stats['version']})")
+
+    async def poll_version(self):
+        while True:
+            await asyncio.sleep(VERSION_POLL_INTERVAL)
+            try:
+                self.version = await self.pool.execute(query_version)
+            except sqlite3.Error as e:
+                print(f"Failed to read DB version: {e}")
+                continue
+            await self.export_ics()
+
+    def respond_ics(self, name, headers):
+        """订阅源文件，ETag是manifest中的校验和"""
+        checksum = self.ics.checksum(name)
+        if checksum is None:
+            return HTTPStatus.NOT_FOUND, json.dumps({'error': f'unknown feed: {name}'}).encode(), None
+        etag = f'"{checksum}"'
+        if headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, b'', etag
+        cached = self._ics_bodies.get(name)
+        if cached is None or cached[0] != checksum:
+            try:
+                with open(self.ics.path(name), 'rb') as f:
+                    cached = (checksum, f.read())
+            except OSError:
+                return HTTPStatus.NOT_FOUND, json.dumps({'error': f'unknown feed: {name}'}).encode(), None
+            # 导出线程先写文件再换manifest，读到的可能已经是新内容，校验和没变时才缓存
+            if self.ics.checksum(name) == checksum:
+                self._ics_bodies[name] = cached
+        return HTTPStatus.OK, cached[1], etag
+
+    async def respond(self, target, headers):
+        """返回 (status, body, etag)"""
+        url = urlsplit(target)
+        if url.path == '/healthz':
+            return HTTPStatus.OK, json.dumps({'status': 'ok', 'version': self.version}).encode(), None
+        if url.path.startswith('/ics/'):
+            return self.respond_ics(url.path[len('/ics/'):], headers)
+
+        query = ROUTES.get(url.path)
+        if query is None:
+            return HTTPStatus.NOT_FOUND, json.dumps({'error': f'unknown path: {url.path}'}).encode(), None
+
+        params = parse_qs(url.query)
+        key = (url.path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == self.version:
+            self._cache.move_to_end(key)
+            _, body, etag = cached
+        else:
+            version = self.version
+            try:
+                body = json.dumps(await self.pool.execute(query, params)).encode()
+            except ValueError as e:
+                return HTTPStatus.BAD_REQUEST, json.dumps({'error': str(e)}).encode(), None
+            except sqlite3.Error as e:
+                # 数据库还没建表、被锁住等：返回500，而不是让异常断开连接
+                print(f"Query {url.path} failed: {e}")
+                return HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({'error': f'database error: {e}'}).encode(), None
+            etag = f'"v{version}-{zlib.crc32(body):08x}"'
+            self._cache[key] = (version, body, etag)
+            self._cache.move_to_end(key)
+            while len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+        if headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, b'', etag
+        return HTTPStatus.OK, body, etag
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, http_version = lines[0].split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                if headers.get('content-length'):
+                    await reader.readexactly(int(headers['content-length']))
+
+                if method not in ('GET', 'HEAD'):
+                    status, body, etag = HTTPStatus.METHOD_NOT_ALLOWED, b'{"error": "method not allowed"}', None
+                else:
+                    status, body, etag = await self.respond(target, headers)
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and http_version == 'HTTP/1.1'
+                calendar = target.startswith('/ics/') and status in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED)
+                response = [
+                    f'HTTP/1.1 {status.value} {status.phrase}',
+                    f'Content-Type: {ICS_CONTENT_TYPE if calendar else JSON_CONTENT_TYPE}',
+                    f'Content-Length: {len(body)}',
+                    'Cache-Control: no-cache',
+                    f'Connection: {"keep-alive" if keep_alive else "close"}',
+                ]
+                if etag:
+                    response.append(f'ETag: {etag}')
+                writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        await self.export_ics()
+        poller = asyncio.create_task(self.poll_version())
+        print(f"Availability API listening on http://{host}:{port} (db: {self.pool.db_name}, version {self.version})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+            self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read-only JSON API for UofT study room availability')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--ics-dir', default=DEFAULT_ICS_DIR)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(AvailabilityAPI(args.db, args.pool_size, args.ics_dir).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nStopping availability API...")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,45 @@
 import sqlite3
-import pandas as pd
 import streamlit as st
 from datetime import datetime, timedelta
-import subprocess
+import importlib.util
 import sys
 import os
+import threading
+from collections import OrderedDict
+
+from db_pool import get_read_pool
+from prewarm import load_snapshot
+from room_catalog import get_room_catalog
+from room_search import search_rooms
 
 # Use directory of this file for all relative paths (works on Streamlit Cloud)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Guards the first import of pandas and script.py: sessions run on their own threads
+_import_lock = threading.Lock()
+
+def import_pandas():
+    """Import pandas on first use, so the page header renders before it is loaded"""
+    with _import_lock:
+        import pandas
+    return pandas
+
+def get_script_module():
+    """Load script.py once per process, only when a fetch actually needs it"""
+    with _import_lock:
+        script_module = sys.modules.get("script")
+        if script_module is None:
+            spec = importlib.util.spec_from_file_location("script", os.path.join(BASE_DIR, 'script.py'))
+            script_module = importlib.util.module_from_spec(spec)
+            sys.modules["script"] = script_module
+            try:
+                spec.loader.exec_module(script_module)
+            except BaseException:
+                # Don't leave a half-initialised module behind; the next call loads it again
+                sys.modules.pop("script", None)
+                raise
+        return script_module
+
 # Robarts library: 7314, 7466, 7474, 7708, 7816
 # Gerstein library: 7416
 # Engineering & Computer Science Library: 7945
@@ -25,62 +56,176 @@ st.set_page_config(
     layout="wide"
 )
 
-@st.cache_data
+# Columns of the shared slots frame, one row per slot (room metadata lives in rooms_df)
+SLOT_COLUMNS = ['space_id', 'start_time', 'status', 'gid', 'date']
+# Slot statuses that are always categories of the status column
+SLOT_STATUSES = ('available', 'unavailable')
+
 def load_data_from_db(db_name=os.path.join(BASE_DIR, "uoft_study_rooms.db")):
     """Load data from SQLite database"""
+    pd = import_pandas()
     try:
-        conn = sqlite3.connect(db_name)
-        
-        # Fetch room info
-        rooms_df = pd.read_sql_query("""
-            SELECT space_id, room_name, gid, capacity_found_at 
-            FROM rooms 
-            ORDER BY space_id
-        """, conn)
-        
-        # Fetch timeslot info
-        slots_df = pd.read_sql_query("""
-            SELECT ts.space_id, ts.start_time, ts.end_time, ts.status, 
-                   r.room_name, r.gid, r.capacity_found_at
-            FROM time_slots ts
-            JOIN rooms r ON ts.space_id = r.space_id
-            ORDER BY ts.space_id, ts.start_time
-        """, conn)
-        
-        conn.close()
-        
-        # Convert datetime
-        slots_df['start_time'] = pd.to_datetime(slots_df['start_time'])
-        slots_df['end_time'] = pd.to_datetime(slots_df['end_time'])
-        slots_df['date'] = slots_df['start_time'].dt.date
-        
-        return rooms_df, slots_df
+        with get_read_pool(db_name).snapshot() as conn:
+            return read_frames(conn)
         
     except Exception as e:
         st.error(f"Failed to load data: {e}")
         return pd.DataFrame(), pd.DataFrame()
 
-def create_schedule_table(slots_df, selected_date, max_rooms=20):
-    """Create the schedule table HTML"""
+def read_frames(conn):
+    """Read the rooms and slots frames over an open connection"""
+    pd = import_pandas()
+    # Fetch room info
+    rooms_df = pd.read_sql_query("""
+        SELECT space_id, room_name, gid, capacity_found_at 
+        FROM rooms 
+        ORDER BY space_id
+    """, conn)
     
-    # Filter by date
-    day_slots = slots_df[slots_df['date'] == selected_date].copy()
+    # Fetch timeslot info (room names etc. stay in rooms_df / the room catalog)
+    slots_df = pd.read_sql_query("""
+        SELECT ts.space_id, ts.start_time, ts.status, r.gid
+        FROM time_slots ts
+        JOIN rooms r ON ts.space_id = r.space_id
+        ORDER BY ts.space_id, ts.start_time
+    """, conn)
     
-    if day_slots.empty:
-        st.warning(f"No data found for {selected_date}")
-        return
+    # Convert datetime
+    slots_df['start_time'] = pd.to_datetime(slots_df['start_time'])
+    slots_df['date'] = slots_df['start_time'].dt.date
     
-    # Create timeslots (every 30 minutes)
-    time_slots = []
-    for hour in range(8, 23):  # 8:00 AM to 11:00 PM
-        for minute in [0, 30]:
-            time_slots.append(f"{hour:02d}:{minute:02d}")
+    return rooms_df, lean_slots_frame(slots_df)
+
+def lean_slots_frame(slots_df):
+    """Compact dtypes for the shared slots frame: 32-bit ids, categorical status and date"""
+    pd = import_pandas()
+    statuses = sorted(set(SLOT_STATUSES).union(slots_df['status'].dropna().unique()))
+    return slots_df.astype({
+        'space_id': 'int32',
+        'gid': 'int32',
+        'status': pd.CategoricalDtype(statuses),
+        'date': 'category',
+    })
+
+def apply_slot_changes(slots_df, changes, rooms_df):
+    """Apply change-feed rows to a slots frame and return the updated frame"""
+    pd = import_pandas()
+    if changes.empty:
+        return slots_df
     
-    # Get room list (limit displayed rooms)
-    room_list = sorted(day_slots['space_id'].unique())[:max_rooms]
+    # Only the latest change per slot matters
+    changes = changes.drop_duplicates(['space_id', 'start_time'], keep='last').copy()
+    changes['start_time'] = pd.to_datetime(changes['start_time'])
+    change_keys = pd.MultiIndex.from_frame(changes[['space_id', 'start_time']])
+    slot_keys = pd.MultiIndex.from_frame(slots_df[['space_id', 'start_time']])
+    new_status = pd.Series(changes['new_status'].to_numpy(), index=change_keys)
     
-    # HTML + CSS styling
-    style = """
+    # Flip statuses of existing slots, drop removed ones
+    slots_df = slots_df.astype({'status': object, 'date': object})
+    hit = slot_keys.isin(change_keys)
+    hit_index = slots_df.index[hit]
+    hit_status = new_status.reindex(slot_keys[hit]).to_numpy()
+    removed = pd.isna(hit_status)
+    slots_df.loc[hit_index[~removed], 'status'] = hit_status[~removed]
+    slots_df = slots_df.drop(hit_index[removed])
+    
+    # Append slots that did not exist before
+    added = changes[~change_keys.isin(slot_keys) & changes['new_status'].notna()]
+    if not added.empty:
+        added = added.rename(columns={'new_status': 'status'})[['space_id', 'start_time', 'status']].merge(
+            rooms_df[['space_id', 'gid']], on='space_id'
+        )
+        added['date'] = added['start_time'].dt.date
+        slots_df = pd.concat([slots_df, added[slots_df.columns]], ignore_index=True)
+        slots_df = slots_df.sort_values(['space_id', 'start_time'], ignore_index=True)
+    
+    return lean_slots_frame(slots_df)
+
+class SlotStore:
+    """Rooms/slots frames shared by all sessions, kept current from the change feed"""
+
+    def __init__(self, db_name):
+        pd = import_pandas()
+        self.db_name = db_name
+        self.version = None
+        self.rooms_df = pd.DataFrame()
+        self.slots_df = pd.DataFrame()
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Sync with the DB and return (rooms_df, slots_df, version)
+
+        Refreshes publish a complete DB in a single write transaction, and the
+        version and the data are read inside one read transaction on a pooled
+        connection, so they always belong together and each publish invalidates
+        the store exactly once.
+        """
+        with self._lock:
+            if not os.path.exists(self.db_name):
+                return self.rooms_df, self.slots_df, self.version
+            try:
+                with get_read_pool(self.db_name).snapshot() as conn:
+                    version = conn.execute('PRAGMA user_version').fetchone()[0]
+                    if version != self.version:
+                        if not self._apply_changes(conn, version):
+                            self._load(conn, version)
+                        self.version = version
+            except Exception as e:
+                st.error(f"Failed to load data: {e}")
+            return self.rooms_df, self.slots_df, self.version
+
+    def _load(self, conn, version):
+        """Full load, taken from the launcher's pre-warm snapshot when it matches"""
+        snapshot = get_prewarm_snapshot()
+        rooms_df = slots_df = None
+        if snapshot is not None:
+            # Hand the frames over once so the snapshot never keeps a stale copy alive
+            rooms_df, slots_df = snapshot.pop("rooms_df", None), snapshot.pop("slots_df", None)
+        if (self.version is None and slots_df is not None and snapshot["version"] == version
+                and list(slots_df.columns) == SLOT_COLUMNS):
+            self.rooms_df, self.slots_df = rooms_df, slots_df
+        else:
+            self.rooms_df, self.slots_df = read_frames(conn)
+
+    def _apply_changes(self, conn, version):
+        """Apply the change feed since our version; False if a full reload is needed"""
+        pd = import_pandas()
+        if self.version is None or version < self.version or self.slots_df.empty:
+            return False
+        try:
+            oldest = conn.execute('SELECT MIN(version) FROM refresh_log').fetchone()[0]
+            if oldest is None or oldest > self.version + 1:
+                return False
+            changes = pd.read_sql_query("""
+                SELECT space_id, start_time, new_status
+                FROM slot_changes
+                WHERE version > ? AND version <= ?
+                ORDER BY id
+            """, conn, params=(self.version, version))
+            rooms_df = pd.read_sql_query("""
+                SELECT space_id, room_name, gid, capacity_found_at 
+                FROM rooms 
+                ORDER BY space_id
+            """, conn)
+        except sqlite3.Error:
+            return False
+        
+        self.slots_df = apply_slot_changes(self.slots_df, changes, rooms_df)
+        self.rooms_df = rooms_df
+        return True
+
+@st.cache_resource
+def get_prewarm_snapshot():
+    """Snapshot written by launcher.py before the browser opened, None if absent"""
+    return load_snapshot()
+
+@st.cache_resource
+def get_slot_store():
+    """Process-wide slot store shared by all sessions"""
+    return SlotStore(os.path.join(BASE_DIR, "uoft_study_rooms.db"))
+
+# Static stylesheet for the schedule table, emitted once per page
+SCHEDULE_STYLE = """
     <style>
     .schedule-container {
         max-width: 100%;
@@ -164,60 +309,275 @@ def create_schedule_table(slots_df, selected_date, max_rooms=20):
     .empty {
         background-color: #f8f9fa;
     }
+    .day-header {
+        background-color: #e9ecef;
+        color: #000000;
+        font-weight: 700;
+        border-left: 2px solid #6c757d;
+    }
+    .schedule-table td.day-start {
+        border-left: 2px solid #6c757d;
+    }
     </style>
-    """
+"""
+
+# Timeslot columns shown in the schedule (every 30 minutes, 8:00 AM to 11:00 PM)
+TIME_SLOTS = tuple(f"{hour:02d}:{minute:02d}" for hour in range(8, 23) for minute in (0, 30))
+
+# Number of days shown in the week view
+WEEK_DAYS = 7
+
+# Page sizes offered for the schedule table
+ROOMS_PER_PAGE_OPTIONS = (25, 50, 100)
+DEFAULT_PAGE_SIZE_INDEX = 1
+
+# Room type selector labels -> gid
+GID_OPTIONS = {
+    "All Rooms": None,
+    "Robarts Common": 7314,
+    "Robarts Library Stacks": 7466,
+    "Robarts Library Ground Floor": 7474,
+    "Robarts Library 3rd Floor": 7708,
+    "Individual Study Rooms": 7816,
+    "Gerstein Library": 7416,
+    "Engineering & Computer Science Library": 7945,
+    "Music Library": 7935,
+    "OISE Library (Main)": 7432,
+    "OISE Library (Secondary)": 7433,
+    "OISE Library (Tertiary)": 7434,
+    "Kelly Library": 7449,
+    "UC Library": 7996,
+    "E.J. Pratt Library": 7970
+}
+
+# Rendered table fragments kept across reruns
+FRAGMENT_CACHE_SIZE = 64
+
+class HtmlFragmentCache:
+    """Thread-safe LRU cache of rendered HTML fragments"""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def sizes(self):
+        """(key, bytes) of every entry, least recently used first"""
+        with self._lock:
+            return [(key, sys.getsizeof(html)) for key, html in self._entries.items()]
+
+@st.cache_resource
+def get_fragment_cache():
+    """Process-wide fragment cache shared by all sessions, seeded from the pre-warm snapshot"""
+    cache = HtmlFragmentCache()
+    snapshot = get_prewarm_snapshot()
+    if snapshot is not None:
+        for key, html in snapshot.pop("fragments", {}).items():
+            cache.put(key, html)
+    return cache
+
+def frame_bytes(df):
+    """Deep memory usage of a DataFrame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+def memory_report():
+    """Memory held by each process-wide cache entry, as (cache, entry, rows, bytes) tuples"""
+    report = []
+    store = get_slot_store()
+    for name, df in (("rooms_df", store.rooms_df), ("slots_df", store.slots_df)):
+        report.append(("slot store", name, len(df), frame_bytes(df)))
+    snapshot = get_prewarm_snapshot()
+    if snapshot is not None:
+        for name in ("rooms_df", "slots_df"):
+            if name in snapshot:
+                report.append(("pre-warm snapshot", name, len(snapshot[name]), frame_bytes(snapshot[name])))
+    for key, size in get_fragment_cache().sizes():
+        report.append(("html fragments", " / ".join(str(part) for part in key), None, size))
+    return report
+
+def show_memory_report():
+    """Sidebar table of cache memory (open the app with ?debug=memory)"""
+    pd = import_pandas()
+    report = memory_report()
+    with st.sidebar.expander("🧠 Memory", expanded=True):
+        st.caption(f"Shared by all sessions: {sum(row[3] for row in report) / 2 ** 20:.2f} MB in {len(report)} entries")
+        st.dataframe(
+            pd.DataFrame(report, columns=["cache", "entry", "rows", "bytes"]),
+            hide_index=True
+        )
+
+def get_db_version(db_name=os.path.join(BASE_DIR, "uoft_study_rooms.db")):
+    """Published refresh version of the DB (PRAGMA user_version), None if missing"""
+    if not os.path.exists(db_name):
+        return None
+    try:
+        with get_read_pool(db_name).connection() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+def create_schedule_table(slots_df, selected_date, max_rooms=20, room_offset=0):
+    """Create the schedule table HTML"""
+    
+    # Filter by date
+    day_slots = slots_df[slots_df['date'] == selected_date]
+    
+    if day_slots.empty:
+        st.warning(f"No data found for {selected_date}")
+        return
+    
+    # Get room list (only the requested page of rooms)
+    room_list = sorted(day_slots['space_id'].unique())[room_offset:room_offset + max_rooms]
+    day_slots = day_slots[day_slots['space_id'].isin(room_list)]
+    catalog = get_room_catalog()
     
-    html = style + '<div class="schedule-container"><table class="schedule-table">'
+    # Lookup table built once instead of filtering per cell
+    slot_keys = day_slots['start_time'].dt.strftime('%H:%M')
+    status_lookup = {}
+    for room_id, slot_key, status in zip(day_slots['space_id'], slot_keys, day_slots['status']):
+        status_lookup.setdefault((room_id, slot_key), status)
+    
+    parts = ['<div class="schedule-container"><table class="schedule-table">']
     
     # Table header
-    html += '<thead><tr><th class="room-name">Room / Time</th>'
-    for time_slot in time_slots:
-        html += f'<th class="time-header">{time_slot}</th>'
-    html += '</tr></thead><tbody>'
+    parts.append('<thead><tr><th class="room-name">Room / Time</th>')
+    parts.extend(f'<th class="time-header">{time_slot}</th>' for time_slot in TIME_SLOTS)
+    parts.append('</tr></thead><tbody>')
     
     # Rows for each room
     for room_id in room_list:
-        room_data = day_slots[day_slots['space_id'] == room_id]
-        room_name = room_data['room_name'].iloc[0] if not room_data.empty else f"Room {room_id}"
+        record = catalog.get(room_id)
+        room_name = record.room_name if record else f"Room {room_id}"
         
         # Simplify room name
         display_name = room_name.replace('Group Study Room ', 'GSR ') if 'Group Study Room' in room_name else room_name
-        html += f'<tr><td class="room-name">{display_name}<br><small>({room_id})</small></td>'
+        parts.append(f'<tr><td class="room-name">{display_name}<br><small>({room_id})</small></td>')
         
         # Cells for each timeslot
-        for time_slot in time_slots:
-            slot_data = room_data[room_data['start_time'].dt.strftime('%H:%M') == time_slot]
-            
-            if not slot_data.empty:
-                status = slot_data['status'].iloc[0]
-                if status == 'available':
-                    booking_url = f"https://libcal.library.utoronto.ca/space/{room_id}?date={selected_date}"
-                    html += f'<td class="available"><a href="{booking_url}" target="_blank"></a></td>'
-                else:
-                    html += '<td class="unavailable"></td>'
+        booking_url = f"https://libcal.library.utoronto.ca/space/{room_id}?date={selected_date}"
+        for time_slot in TIME_SLOTS:
+            status = status_lookup.get((room_id, time_slot))
+            if status == 'available':
+                parts.append(f'<td class="available"><a href="{booking_url}" target="_blank"></a></td>')
+            elif status is not None:
+                parts.append('<td class="unavailable"></td>')
+            else:
+                parts.append('<td class="empty"></td>')
+        
+        parts.append('</tr>')
+    
+    parts.append('</tbody></table></div>')
+    
+    return ''.join(parts)
+
+def get_schedule_table_html(slots_df, selected_date, gid, max_rooms, db_version, room_offset=0, room_filter=None):
+    """Return the schedule table HTML, reusing cached fragments across reruns"""
+    cache = get_fragment_cache()
+    key = (db_version, selected_date, gid, max_rooms, room_offset, room_filter)
+    html = cache.get(key)
+    if html is None:
+        html = create_schedule_table(slots_df, selected_date, max_rooms, room_offset)
+        if html:
+            cache.put(key, html)
+    return html
+
+def week_slots(slots_df, start_date, days=WEEK_DAYS):
+    """Slots of a date range, selected from the shared slots frame instead of a per-session copy"""
+    day_list = [start_date + timedelta(days=offset) for offset in range(days)]
+    return slots_df.loc[slots_df['date'].isin(day_list), ['space_id', 'start_time', 'status']]
+
+def create_week_table(week_df, start_date, days=WEEK_DAYS, max_rooms=20, room_offset=0, room_filter=None):
+    """Create the room x (day, timeslot) week table HTML"""
+    pd = import_pandas()
+    
+    if room_filter is not None:
+        week_df = week_df[week_df['space_id'].isin(room_filter)]
+    
+    if week_df.empty:
+        st.warning(f"No data found for the week starting {start_date}")
+        return
+    
+    room_list = sorted(week_df['space_id'].unique())[room_offset:room_offset + max_rooms]
+    week_df = week_df[week_df['space_id'].isin(room_list)]
+    catalog = get_room_catalog()
+    day_list = [start_date + timedelta(days=offset) for offset in range(days)]
+    
+    # One pivot for the whole range: rows are rooms, columns are (day, timeslot)
+    columns = pd.MultiIndex.from_product([day_list, TIME_SLOTS])
+    grid = week_df.assign(
+        day=week_df['start_time'].dt.date,
+        slot=week_df['start_time'].dt.strftime('%H:%M')
+    ).pivot_table(index='space_id', columns=['day', 'slot'], values='status', aggfunc='first')
+    grid = grid.reindex(index=room_list, columns=columns)
+    
+    parts = ['<div class="schedule-container"><table class="schedule-table">']
+    
+    # Two header rows: days, then timeslots within each day
+    parts.append('<thead><tr><th class="room-name" rowspan="2">Room / Time</th>')
+    parts.extend(f'<th class="day-header" colspan="{len(TIME_SLOTS)}">{day:%a %Y-%m-%d}</th>' for day in day_list)
+    parts.append('</tr><tr>')
+    for _ in day_list:
+        parts.extend(f'<th class="time-header">{time_slot}</th>' for time_slot in TIME_SLOTS)
+    parts.append('</tr></thead><tbody>')
+    
+    for room_id, statuses in zip(room_list, grid.to_numpy()):
+        record = catalog.get(room_id)
+        room_name = record.room_name if record else f"Room {room_id}"
+        display_name = room_name.replace('Group Study Room ', 'GSR ') if 'Group Study Room' in room_name else room_name
+        parts.append(f'<tr><td class="room-name">{display_name}<br><small>({room_id})</small></td>')
+        
+        for (day, time_slot), status in zip(columns, statuses):
+            day_start = ' day-start' if time_slot == TIME_SLOTS[0] else ''
+            if status == 'available':
+                booking_url = f"https://libcal.library.utoronto.ca/space/{room_id}?date={day}"
+                parts.append(f'<td class="available{day_start}"><a href="{booking_url}" target="_blank"></a></td>')
+            elif isinstance(status, str):
+                parts.append(f'<td class="unavailable{day_start}"></td>')
             else:
-                html += '<td class="empty"></td>'
+                parts.append(f'<td class="empty{day_start}"></td>')
         
-        html += '</tr>'
+        parts.append('</tr>')
     
-    html += '</tbody></table></div>'
+    parts.append('</tbody></table></div>')
     
+    return ''.join(parts)
+
+def get_week_table_html(slots_df, start_date, gid, max_rooms, db_version, room_offset=0, room_filter=None):
+    """Return the week table HTML, reusing cached fragments across reruns"""
+    cache = get_fragment_cache()
+    key = ('week', db_version, start_date, gid, max_rooms, room_offset, room_filter)
+    html = cache.get(key)
+    if html is None:
+        week_df = week_slots(slots_df, start_date)
+        html = create_week_table(week_df, start_date, WEEK_DAYS, max_rooms, room_offset, room_filter)
+        if html:
+            cache.put(key, html)
     return html
 
 def get_available_dates_from_db(db_name=os.path.join(BASE_DIR, "uoft_study_rooms.db")):
     """Get list of available dates from DB"""
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT query_date, COUNT(*) as slot_count 
-            FROM time_slots 
-            GROUP BY query_date 
-            ORDER BY query_date
-        ''')
-        dates_data = cursor.fetchall()
-        conn.close()
-        return dates_data
+        with get_read_pool(db_name).connection() as conn:
+            return conn.execute('''
+                SELECT DISTINCT query_date, COUNT(*) as slot_count 
+                FROM time_slots 
+                GROUP BY query_date 
+                ORDER BY query_date
+            ''').fetchall()
     except Exception as e:
         print(f"Failed to fetch dates: {e}")
         return []
@@ -232,26 +592,23 @@ def fetch_schedule_for_date(target_date, force_refresh=False):
         
         # Skip if already present (unless refresh forced)
         if not force_refresh:
-            conn = sqlite3.connect(os.path.join(BASE_DIR, "uoft_study_rooms.db"))
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM time_slots WHERE query_date = ?', (target_date_str,))
-            existing_count = cursor.fetchone()[0]
-            conn.close()
+            next_date_str = (datetime.strptime(target_date_str, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            with get_read_pool(os.path.join(BASE_DIR, "uoft_study_rooms.db")).connection() as conn:
+                existing_count = conn.execute(
+                    'SELECT COUNT(*) FROM time_slots WHERE start_time >= ? AND start_time < ?', (target_date_str, next_date_str)
+                ).fetchone()[0]
             
             if existing_count > 0:
                 return True, f"Data for {target_date_str} already exists ({existing_count} records). Use refresh to update."
         
-        # Import and run script.py
-        script_path = os.path.join(BASE_DIR, 'script.py')
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("script", script_path)
-        script_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(script_module)
-
-        script_module.check_all_rooms_availability_sqlite(target_date_str, target_date_str)
+        # Refresh only this date; other days in the DB are left untouched
+        script_module = get_script_module()
+        result = script_module.refresh_date(target_date_str, os.path.join(BASE_DIR, "uoft_study_rooms.db"))
+        if result is None:
+            return False, "No rooms in the database to fetch"
         
         action = "refreshed" if force_refresh else "fetched"
-        return True, f"Successfully {action} data for {target_date_str}"
+        return True, f"Successfully {action} data for {target_date_str} ({result['rooms']} rooms, {result['changes']} changed slots)"
         
     except Exception as e:
         return False, f"Failed to fetch schedule: {str(e)}"
@@ -262,22 +619,19 @@ def main():
 
     # Sidebar refresh button
     with st.sidebar:
-        
+        crawler_backend = st.selectbox(
+            "Crawler", ["threads", "async"],
+            help="async fetches all rooms concurrently over a pool of keep-alive connections"
+        )
         if st.button("🔄 Get Latest Data", help="Fetch all rooms from API (today + next 2 weeks). This may take a while."):
             with st.spinner("Fetching latest data, please wait..."):
                 try:
-                    import importlib.util
-                    import os
-                    from datetime import datetime, timedelta
-                    script_path = os.path.join(BASE_DIR, 'script.py')
-                    spec = importlib.util.spec_from_file_location("script", script_path)
-                    script_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(script_module)
+                    script_module = get_script_module()
                     start_date = datetime.now().strftime('%Y-%m-%d')
                     end_date = (datetime.now() + timedelta(weeks=2)).strftime('%Y-%m-%d')
                     db_name = os.path.join(BASE_DIR, "uoft_study_rooms.db")
-                    script_module.check_all_rooms_availability_sqlite(start_date, end_date, db_name)
-                    st.cache_data.clear()  # Clear cache after data refresh
+                    script_module.check_all_rooms_availability_sqlite(start_date, end_date, db_name, backend=crawler_backend)
+                    # Sessions pick up the published change feed on their next rerun
                     st.success(f"Data refreshed: {start_date} ~ {end_date}")
                     st.rerun()
                 except Exception as e:
@@ -285,7 +639,7 @@ def main():
 
     # Load data
     with st.spinner("Loading data..."):
-        rooms_df, slots_df = load_data_from_db()
+        rooms_df, slots_df, db_version = get_slot_store().snapshot()
     
     if rooms_df.empty or slots_df.empty:
         st.error("Could not load data. Please ensure DB file exists and contains data.")
@@ -294,29 +648,11 @@ def main():
     # Sidebar
     st.sidebar.header("📅 Options")
     
-    gid_options = {
-        "All Rooms": None,
-        "Robarts Common": 7314,
-        "Robarts Library Stacks": 7466,
-        "Robarts Library Ground Floor": 7474,
-        "Robarts Library 3rd Floor": 7708,
-        "Individual Study Rooms": 7816,
-        "Gerstein Library": 7416,
-        "Engineering & Computer Science Library": 7945,
-        "Music Library": 7935,
-        "OISE Library (Main)": 7432,
-        "OISE Library (Secondary)": 7433,
-        "OISE Library (Tertiary)": 7434,
-        "Kelly Library": 7449,
-        "UC Library": 7996,
-        "E.J. Pratt Library": 7970
-    }
-
     selected_gid_label = st.sidebar.selectbox(
         "Select room type",
-        list(gid_options.keys())
+        list(GID_OPTIONS.keys())
     )
-    selected_gid = gid_options[selected_gid_label]
+    selected_gid = GID_OPTIONS[selected_gid_label]
     
     # Filter by gid
     if selected_gid is not None:
@@ -326,6 +662,17 @@ def main():
         filtered_rooms_df = rooms_df
         filtered_slots_df = slots_df
     
+    # Room search (fuzzy, understands abbreviations like "GSR 2D")
+    room_query = st.sidebar.text_input("Search rooms", placeholder="e.g. GSR 2D, UC366A, Sussex 2")
+    room_filter = None
+    if room_query.strip():
+        room_filter = tuple(sorted(record.space_id for record in search_rooms(room_query, limit=None)))
+        filtered_rooms_df = filtered_rooms_df[filtered_rooms_df['space_id'].isin(room_filter)]
+        filtered_slots_df = filtered_slots_df[filtered_slots_df['space_id'].isin(room_filter)]
+        if filtered_rooms_df.empty:
+            st.warning(f"No rooms match \"{room_query}\" in {selected_gid_label}")
+            return
+    
     # Date selection
     available_dates = sorted(filtered_slots_df['date'].unique())
     if not available_dates:
@@ -338,9 +685,22 @@ def main():
         min_value=min(available_dates),
         max_value=max(available_dates)
     )
+    view_mode = st.sidebar.radio("View", ["Day", "Week"], horizontal=True)
     
-    # Show all rooms
-    max_rooms = len(filtered_rooms_df)
+    # Paginate rooms so the table payload stays bounded as the catalog grows; the tables page over
+    # the rooms that have slots on the selected day (or week), so the page count uses the same list
+    if view_mode == "Week":
+        paged_slots = week_slots(filtered_slots_df, selected_date)
+    else:
+        paged_slots = filtered_slots_df[filtered_slots_df['date'] == selected_date]
+    room_count = paged_slots['space_id'].nunique()
+    max_rooms = st.sidebar.selectbox("Rooms per page", ROOMS_PER_PAGE_OPTIONS, index=DEFAULT_PAGE_SIZE_INDEX)
+    page_count = max(1, -(-room_count // max_rooms))
+    if page_count > 1:
+        page = st.sidebar.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    else:
+        page = 1
+    room_offset = (page - 1) * max_rooms
     
     # Stats
     col1, col2, col3, col4 = st.columns(4)
@@ -371,11 +731,21 @@ def main():
     st.markdown("---")
     
     # Schedule table
-    st.markdown(f"### 📅 {selected_date} - {selected_gid_label}")
-    
-    html_table = create_schedule_table(filtered_slots_df, selected_date, max_rooms)
+    if view_mode == "Week":
+        st.markdown(f"### 📅 Week of {selected_date} - {selected_gid_label}")
+        html_table = get_week_table_html(filtered_slots_df, selected_date, selected_gid, max_rooms, db_version, room_offset, room_filter)
+    else:
+        st.markdown(f"### 📅 {selected_date} - {selected_gid_label}")
+        html_table = get_schedule_table_html(filtered_slots_df, selected_date, selected_gid, max_rooms, db_version, room_offset, room_filter)
     if html_table:
+        if page_count > 1:
+            last_room = min(room_offset + max_rooms, room_count)
+            st.caption(f"Showing rooms {room_offset + 1}-{last_room} of {room_count} (page {page}/{page_count})")
+        st.markdown(SCHEDULE_STYLE, unsafe_allow_html=True)
         st.markdown(html_table, unsafe_allow_html=True)
+    
+    if st.query_params.get("debug") == "memory":
+        show_memory_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于asyncio的抓取引擎 (check_all_rooms_availability_sqlite的backend="async")
+
+单线程内用keep-alive连接池并发请求 房间 × 日期块，信号量限制并发数，令牌间隔限制
+请求速率；解析后的时间槽经队列交给唯一的写入任务，写入任务在专用线程中执行SQLite写入，
+不阻塞事件循环。
+
+用法:  python async_crawler.py [--start 2025-09-27] [--end 2025-10-11] [--concurrency 8] [--rate 4]
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from room_catalog import get_room_catalog
+from script import (
+    CHUNK_DAYS,
+    CHUNK_RETRIES,
+    GRID_API_URL,
+    build_grid_request,
+    crawl_lock,
+    get_available_rooms_from_sqlite,
+    get_refresh_window,
+    init_sqlite_database,
+    interleave_by_gid,
+    json_loads,
+    open_crawl_workspace,
+    parse_slots_by_item,
+    prune_slots_before,
+    publish_refresh,
+    replace_slots_with_changes,
+    split_date_range,
+    swap_in_crawl_workspace,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+
+# 同时进行的请求数 (也是连接池大小)
+DEFAULT_CONCURRENCY = 8
+# 允许的请求速率 (每秒)，0或None表示不限制
+DEFAULT_RATE = 4.0
+# 单个请求的超时 (秒)
+REQUEST_TIMEOUT = 30
+# 写入队列的长度，写入跟不上时抓取会等待
+WRITE_QUEUE_SIZE = 256
+
+
+class KeepAliveHTTPClient:
+    """最小的asyncio HTTP/1.1客户端，复用同一host的keep-alive连接"""
+
+    def __init__(self, base_url=GRID_API_URL, timeout=REQUEST_TIMEOUT):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.path = url.path or '/'
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self._ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self.timeout = timeout
+        self._idle = []
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    async def _connect(self):
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl)
+
+    async def request(self, method, body=b'', headers=None):
+        """发送请求，返回 (status, body)；复用的空闲连接已被服务器关闭时自动重连一次"""
+        for attempt in range(2):
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                status, data, keep_alive = await asyncio.wait_for(
+                    self._exchange(reader, writer, method, body, headers or {}), self.timeout
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, data
+
+    async def _exchange(self, reader, writer, method, body, headers):
+        self.requests_sent += 1
+        lines = [f'{method} {self.path} HTTP/1.1', f'Host: {self.host}', f'Content-Length: {len(body)}', 'Connection: keep-alive']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        status = int(status_line.split(b' ', 2)[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = response_headers.get('connection', '').lower() != 'close'
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(parts)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, data, keep_alive
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class RateLimiter:
+    """按固定间隔发放请求名额"""
+
+    def __init__(self, rate=DEFAULT_RATE):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def fetch_grid(client, space_id, gid, start_date, end_date):
+    """异步请求grid API，失败时返回None"""
+    payload, headers = build_grid_request(space_id, gid, start_date, end_date)
+    try:
+        status, body = await client.request('POST', urlencode(payload).encode(), headers)
+        if status != 200:
+            print(f"API request error: HTTP {status} for room {space_id} {start_date}~{end_date}")
+            return None
+        return json_loads(body)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+        print(f"API request error for room {space_id} {start_date}~{end_date}: {e!r}")
+        return None
+
+
+def write_batch(conn, batch, query_date, version, known_rooms, catalog):
+    """在写入线程中执行：替换每个 (房间, 窗口) 的时间槽，连同断点记录提交一次"""
+    cursor = conn.cursor()
+    change_count = 0
+    for space_id, gid, slots, window, chunk in batch:
+        record = catalog.get(space_id)
+        if space_id not in known_rooms and record:
+            cursor.execute('''
+                INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
+                VALUES (?, ?, ?, ?, ?)
+            ''', record.as_row())
+            known_rooms.add(space_id)
+        change_count += replace_slots_with_changes(cursor, space_id, gid, slots, window, query_date, version)
+        cursor.execute('''
+            INSERT OR REPLACE INTO crawl_journal (space_id, chunk_start, chunk_end, gid) VALUES (?, ?, ?, ?)
+        ''', (space_id, *chunk, gid))
+    conn.commit()
+    return change_count
+
+
+async def write_slots(queue, db_name, query_date, version, known_rooms, catalog):
+    """唯一的写入任务：把队列中已有的结果合并成一个事务写入，返回 (写入单元数, 变化数)"""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='crawl-writer')
+    conn = await loop.run_in_executor(executor, sqlite3.connect, db_name)
+    written = changes = 0
+    try:
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            if batch:
+                changes += await loop.run_in_executor(executor, write_batch, conn, batch, query_date, version, known_rooms, catalog)
+                written += len(batch)
+    finally:
+        await loop.run_in_executor(executor, conn.close)
+        executor.shutdown()
+    return written, changes
+
+
+async def crawl(start_date, end_date, db_name=DEFAULT_DB, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                chunk_days=CHUNK_DAYS, retries=CHUNK_RETRIES, api_url=GRID_API_URL):
+    """抓取所有房间 × 日期块并写入数据库，返回统计信息"""
+    rooms = get_available_rooms_from_sqlite(db_name)
+    if not rooms:
+        print("没有找到房间列表，请先导入房间数据")
+        return None
+
+    started = time.time()
+    # 写入工作数据库，完成后发布到正式数据库；中断后重新运行时跳过已完成的 (房间, 日期块)。
+    # 抓取锁保证同一时间只有一个抓取使用工作数据库
+    with crawl_lock(db_name):
+        work_db, version, done = open_crawl_workspace(db_name, start_date, end_date)
+        prune_slots_before(start_date, version, work_db)
+
+        catalog = get_room_catalog()
+        gids = {space_id: gid for space_id, gid, _ in rooms}
+        chunks = split_date_range(start_date, end_date, chunk_days)
+
+        # 同一日期块内按gid轮流排列，顺带返回的房间不再单独请求
+        ordered = interleave_by_gid(rooms)
+        covered = {(space_id, chunk) for space_id, chunks_done in done.items() for chunk in chunks_done}
+        units = [(room, chunk) for chunk in chunks for room in ordered if (room[0], chunk) not in covered]
+
+        client = KeepAliveHTTPClient(api_url)
+        limiter = RateLimiter(rate)
+        semaphore = asyncio.Semaphore(concurrency)
+        queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        writer = asyncio.create_task(write_slots(queue, work_db, start_date, version, set(gids), catalog))
+
+        async def run_unit(room, chunk):
+            space_id, gid, _ = room
+            async with semaphore:
+                if (space_id, chunk) in covered:
+                    return True
+                await limiter.wait()
+                data = await fetch_grid(client, space_id, gid, *chunk)
+            if not data or 'slots' not in data:
+                return False
+
+            slots_by_item = parse_slots_by_item(data['slots'])
+            # 目标房间的响应里没有它自己的时间槽也要写入：替换掉旧数据并记录到断点
+            slots_by_item.setdefault(space_id, [])
+            # 最后一个块的窗口延伸到API返回的最后一天，其余块严格按块边界切分
+            all_slots = [slot for slots in slots_by_item.values() for slot in slots]
+            window = get_refresh_window(chunk[0], chunk[1], all_slots) if chunk == chunks[-1] else chunk
+            for item_id, slots in slots_by_item.items():
+                if (item_id, chunk) in covered:
+                    continue
+                covered.add((item_id, chunk))
+                item_gid = gids.get(item_id) or catalog.gid_of(item_id)
+                await queue.put((item_id, item_gid, [slot for slot in slots if window[0] <= slot[0] < window[1]], window, chunk))
+            return True
+
+        async def produce():
+            pending = units
+            for attempt in range(retries + 1):
+                if attempt:
+                    print(f"Retrying {len(pending)} failed room/date chunks (attempt {attempt})")
+                    await asyncio.sleep(attempt)
+                results = await asyncio.gather(*(run_unit(room, chunk) for room, chunk in pending))
+                pending = [unit for unit, ok in zip(pending, results) if not ok and (unit[0][0], unit[1]) not in covered]
+                if not pending:
+                    break
+            await queue.put(None)
+            return pending
+
+        # 抓取和写入同时等待：写入任务只会因为出错提前结束，这时停止抓取并抛出写入错误，
+        # 否则抓取任务会一直卡在已满的队列上
+        producer = asyncio.create_task(produce())
+        try:
+            await asyncio.wait([producer, writer], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            try:
+                if writer.done() or not producer.done():
+                    producer.cancel()
+                    await asyncio.gather(producer, return_exceptions=True)
+                # 抓取出错或被中断时，已经排队的结果照常写完，续抓时不必重新抓取
+                if not writer.done() and (producer.cancelled() or producer.exception() is not None):
+                    await queue.put(None)
+                written, changes = await writer
+            finally:
+                await client.close()
+        failed = producer.result()
+
+        publish_refresh(version, work_db)
+        version = swap_in_crawl_workspace(work_db, db_name)
+    elapsed = time.time() - started
+    result = {
+        'requests': client.requests_sent,
+        'connections': client.connections_opened,
+        'written': written,
+        'failed': len(failed),
+        'changes': changes,
+        'version': version,
+        'seconds': elapsed,
+    }
+    print(f"\nAsync crawl completed in {elapsed:.1f}s:")
+    print(f"  Requests: {client.requests_sent} over {client.connections_opened} connections "
+          f"({client.requests_sent / max(elapsed, 1e-9):.1f} req/s)")
+    print(f"  Room/date chunks written: {written}, failed: {len(failed)}")
+    print(f"  Changed slots: {changes}")
+    return result
+
+
+def crawl_all_rooms(start_date, end_date, db_name=DEFAULT_DB, **options):
+    """同步入口，供check_all_rooms_availability_sqlite和app.py调用"""
+    return asyncio.run(crawl(start_date, end_date, db_name, **options))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio crawler for all rooms')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--start', default=datetime.now().strftime('%Y-%m-%d'))
+    parser.add_argument('--end', default=(datetime.now() + timedelta(weeks=2)).strftime('%Y-%m-%d'))
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='requests in flight')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='max requests per second (0 = unlimited)')
+    args = parser.parse_args()
+
+    init_sqlite_database(args.db)
+    crawl_all_rooms(args.start, args.end, args.db, concurrency=args.concurrency, rate=args.rate)
+
+
+if __name__ == '__main__':
+    main()
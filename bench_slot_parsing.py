@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间槽解析基准：旧的逐个构建字典的写法 vs script.parse_slots / parse_slots_by_item
+
+用法:  python bench_slot_parsing.py [--rooms 18] [--days 14] [--repeat 30]
+"""
+
+import argparse
+import gc
+import json
+import time
+from datetime import datetime, timedelta
+
+import script
+
+
+def make_payload(rooms, days):
+    """生成和grid API响应结构相同的JSON (每个房间每天15小时、30分钟一个时间槽)"""
+    start = datetime(2025, 9, 27)
+    slots = []
+    for item_id in range(30000, 30000 + rooms):
+        for day in range(days):
+            for half_hour in range(16, 46):
+                slot_start = start + timedelta(days=day, minutes=30 * half_hour)
+                slot = {
+                    'start': slot_start.strftime('%Y-%m-%d %H:%M:%S'),
+                    'end': (slot_start + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M:%S'),
+                    'itemId': item_id,
+                    'checksum': f'{item_id:x}{day:02d}{half_hour:02d}',
+                }
+                if (item_id + day + half_hour) % 3 == 0:
+                    slot['className'] = 's-lc-eq-checkout'
+                slots.append(slot)
+    return json.dumps({'slots': slots}).encode()
+
+
+def legacy_parse(raw_slots):
+    """改动前的写法：按itemId分组，再为每个时间槽构建字典并拼接可用/不可用列表"""
+    slots_by_item = {}
+    for slot in raw_slots:
+        slots_by_item.setdefault(slot['itemId'], []).append(slot)
+    parsed = {}
+    for item_id, slots in slots_by_item.items():
+        available_slots = []
+        unavailable_slots = []
+        for slot in slots:
+            slot_info = {
+                'start': slot['start'],
+                'end': slot['end'],
+                'item_id': slot['itemId'],
+                'checksum': slot.get('checksum', '')
+            }
+            if 'className' not in slot or slot['className'] != 's-lc-eq-checkout':
+                slot_info['status'] = 'available'
+                available_slots.append(slot_info)
+            else:
+                slot_info['status'] = 'unavailable'
+                unavailable_slots.append(slot_info)
+        parsed[item_id] = available_slots + unavailable_slots
+    return parsed
+
+
+def best_of(repeat, func, *args):
+    """多次运行取最快一次，每次运行前先回收上一次的结果"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark slot parsing')
+    parser.add_argument('--rooms', type=int, default=18, help='rooms per response (API pageSize)')
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    payload = make_payload(args.rooms, args.days)
+    raw_slots = json.loads(payload)['slots']
+    print(f"Payload: {len(raw_slots)} slots, {len(payload) / 1024:.0f} KiB")
+
+    # 两种写法的结果必须一致
+    legacy = legacy_parse(raw_slots)
+    current = script.parse_slots_by_item(raw_slots)
+    assert {item_id: sorted((s['start'], s['end'], s['status'], s['item_id'], s['checksum']) for s in slots)
+            for item_id, slots in legacy.items()} == {item_id: sorted(slots) for item_id, slots in current.items()}
+
+    decoders = [('json', json.loads)]
+    if script.json_loads is not json.loads:
+        decoders.append(('orjson', script.json_loads))
+
+    print(f"{'decode':>8} {'parser':>10} {'ms':>8} {'us/slot':>8}")
+    for parser_name, parse in (('dicts', legacy_parse), ('tuples', script.parse_slots_by_item)):
+        elapsed = best_of(args.repeat, parse, raw_slots)
+        print(f"{'-':>8} {parser_name:>10} {elapsed * 1000:8.2f} {elapsed * 1e6 / len(raw_slots):8.3f}")
+    for decoder_name, loads in decoders:
+        for parser_name, parse in (('dicts', legacy_parse), ('tuples', script.parse_slots_by_item)):
+            elapsed = best_of(args.repeat, lambda: parse(loads(payload)['slots']))
+            print(f"{decoder_name:>8} {parser_name:>10} {elapsed * 1000:8.2f} {elapsed * 1e6 / len(raw_slots):8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内共享的SQLite只读连接池 (app.py、script.py、api_server.py和query_service.py共用)
+
+连接打开一次后复用，每个连接设置好只读和缓存相关的pragma，并保留预编译语句缓存；
+数据库是WAL模式 (init_sqlite_database设置)，读者之间、读者和发布之间都不会互相阻塞。
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# 每个数据库最多同时打开的只读连接数
+DEFAULT_POOL_SIZE = 8
+# 每个连接缓存的预编译语句数
+STATEMENT_CACHE_SIZE = 256
+# 只读连接的设置：禁止写入、内存映射读取、每个连接约32MB页缓存、临时表放在内存
+READ_PRAGMAS = (
+    'PRAGMA query_only = 1',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -32000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def db_file_identity(db_name):
+    """数据库文件的 (设备, inode)；文件被整个替换时变化，池中的旧连接需要重新打开"""
+    try:
+        stat = os.stat(db_name)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class ReadPool:
+    """线程安全的只读连接池，借出的连接用完放回，最多同时打开size个"""
+
+    def __init__(self, db_name, size=DEFAULT_POOL_SIZE):
+        self.db_name = db_name
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _connect(self):
+        # 先取identity再连接：两者之间文件被替换时下次借出会再重连一次，而不会一直读旧文件
+        identity = db_file_identity(self.db_name)
+        conn = sqlite3.connect(
+            f'file:{self.db_name}?mode=ro', uri=True,
+            check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+        )
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        self.connections_opened += 1
+        return conn, identity
+
+    @contextmanager
+    def connection(self):
+        """借出一个只读连接 (自动提交模式，每条语句各自读取最新发布的数据)"""
+        self._slots.acquire()
+        try:
+            try:
+                conn, identity = self._idle.get_nowait()
+                if db_file_identity(self.db_name) != identity:
+                    conn.close()
+                    conn, identity = self._connect()
+            except queue.Empty:
+                conn, identity = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put((conn, identity))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def snapshot(self):
+        """借出一个处在读事务中的连接：期间的所有查询看到同一个已发布版本"""
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+
+def get_read_pool(db_name, size=DEFAULT_POOL_SIZE):
+    """返回db_name对应的进程内共享连接池"""
+    db_name = os.path.abspath(db_name)
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ReadPool(db_name, size)
+        return pool
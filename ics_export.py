@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+空闲时间的iCalendar订阅源：每个房间一个 room-<space_id>.ics，每个gid一个 gid-<gid>.ics
+
+增量生成：manifest.json记录上次导出的数据库版本和每个订阅源的校验和，
+之后只检查变更日志中变化过的房间，校验和没变的订阅源不重新生成。
+api_server.py在 /ics/<文件名> 提供这些文件 (带ETag)。
+
+导出:  python ics_export.py [--db uoft_study_rooms.db] [--out .cache/ics] [--full]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from db_pool import get_read_pool
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, '.cache', 'ics')
+MANIFEST_NAME = 'manifest.json'
+
+BOOKING_URL = 'https://libcal.library.utoronto.ca/space/{space_id}?date={date}'
+TIMEZONE = 'America/Toronto'
+# 多伦多时区 (北美东部时间，2007年起的夏令时规则)，DTSTART/DTEND用TZID引用它
+VTIMEZONE = (
+    'BEGIN:VTIMEZONE', f'TZID:{TIMEZONE}',
+    'BEGIN:DAYLIGHT', 'TZOFFSETFROM:-0500', 'TZOFFSETTO:-0400', 'TZNAME:EDT',
+    'DTSTART:19700308T020000', 'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU', 'END:DAYLIGHT',
+    'BEGIN:STANDARD', 'TZOFFSETFROM:-0400', 'TZOFFSETTO:-0500', 'TZNAME:EST',
+    'DTSTART:19701101T020000', 'RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU', 'END:STANDARD',
+    'END:VTIMEZONE',
+)
+
+
+def room_feed_name(space_id):
+    return f'room-{space_id}.ics'
+
+
+def gid_feed_name(gid):
+    return f'gid-{gid}.ics'
+
+
+def escape_text(value):
+    """RFC 5545 TEXT转义"""
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold_line(line):
+    """超过75字节的内容行折行 (续行以空格开头，不拆开UTF-8多字节字符)"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > (75 if not parts else 74):
+        cut = 75 if not parts else 74
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def ics_time(value):
+    """'2026-10-19 08:00:00' -> '20261019T080000' (当地时间)"""
+    return value[:19].replace('-', '').replace(':', '').replace(' ', 'T')
+
+
+def free_windows(slots):
+    """把首尾相接的可用时间槽合并成空闲时间段；slots是按开始时间排序的 (start, end)"""
+    windows = []
+    for start, end in slots:
+        if windows and windows[-1][1] == start:
+            windows[-1][1] = end
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def windows_checksum(room_name, windows):
+    digest = hashlib.sha1(room_name.encode('utf-8'))
+    for start, end in windows:
+        digest.update(f'{start}|{end};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def room_events(space_id, room_name, windows, stamp):
+    """一个房间所有空闲时间段的VEVENT内容行"""
+    summary = escape_text(f'Free: {room_name}')
+    location = escape_text(room_name)
+    lines = []
+    for start, end in windows:
+        lines.extend((
+            'BEGIN:VEVENT',
+            f'UID:{space_id}-{ics_time(start)}@uoft-study-rooms',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART;TZID={TIMEZONE}:{ics_time(start)}',
+            f'DTEND;TZID={TIMEZONE}:{ics_time(end)}',
+            f'SUMMARY:{summary}',
+            f'LOCATION:{location}',
+            f'URL:{BOOKING_URL.format(space_id=space_id, date=start[:10])}',
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ))
+    return lines
+
+
+def render_calendar(name, events):
+    lines = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Better Robarts Timetable//Free rooms//EN',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', f'X-WR-CALNAME:{escape_text(name)}', f'X-WR-TIMEZONE:{TIMEZONE}',
+        *VTIMEZONE, *events, 'END:VCALENDAR',
+    ]
+    return '\r\n'.join(fold_line(line) for line in lines) + '\r\n'
+
+
+def write_file(path, data):
+    """先写临时文件再替换，读者 (api_server) 不会读到半个文件"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class IcsExporter:
+    """按校验和增量生成订阅源，manifest记录 {version, rooms: {space_id: [gid, 校验和]}, gids: {gid: 校验和}}"""
+
+    def __init__(self, db_name=DEFAULT_DB, output_dir=DEFAULT_OUTPUT_DIR):
+        self.db_name = db_name
+        self.output_dir = output_dir
+        self.manifest = self._load_manifest()
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+            return {
+                'version': manifest['version'],
+                'rooms': {int(space_id): tuple(entry) for space_id, entry in manifest['rooms'].items()},
+                'gids': {int(gid): checksum for gid, checksum in manifest['gids'].items()},
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return {'version': None, 'rooms': {}, 'gids': {}}
+
+    def _save_manifest(self, manifest):
+        data = json.dumps({
+            'version': manifest['version'],
+            'rooms': {str(space_id): list(entry) for space_id, entry in manifest['rooms'].items()},
+            'gids': {str(gid): checksum for gid, checksum in manifest['gids'].items()},
+        }, sort_keys=True).encode('utf-8')
+        write_file(os.path.join(self.output_dir, MANIFEST_NAME), data)
+
+    def checksum(self, name):
+        """订阅源当前的校验和 (用作ETag)，不存在时返回None"""
+        manifest = self.manifest
+        if not name.endswith('.ics'):
+            return None
+        try:
+            kind, key = name[:-len('.ics')].split('-', 1)
+            if kind == 'room':
+                entry = manifest['rooms'].get(int(key))
+                return entry[1] if entry else None
+            if kind == 'gid':
+                return manifest['gids'].get(int(key))
+        except ValueError:
+            pass
+        return None
+
+    def path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def _changed_rooms(self, conn, version):
+        """上次导出之后变化过的房间；变更日志不完整 (或首次导出) 时返回None表示全部检查"""
+        last = self.manifest['version']
+        if last is None or version < last:
+            return None
+        if version == last:
+            return set()
+        try:
+            oldest = conn.execute('SELECT MIN(version) FROM refresh_log').fetchone()[0]
+            if oldest is None or oldest > last + 1:
+                return None
+            rows = conn.execute(
+                'SELECT DISTINCT space_id FROM slot_changes WHERE version > ? AND version <= ?', (last, version)
+            ).fetchall()
+        except sqlite3.Error:
+            return None
+        return {space_id for (space_id,) in rows}
+
+    def _load_windows(self, conn, space_ids):
+        """指定房间的空闲时间段 {space_id: [[start, end], ...]}"""
+        windows = {space_id: [] for space_id in space_ids}
+        if not windows:
+            return windows
+        placeholders = ','.join('?' * len(windows))
+        rows = conn.execute(f'''
+            SELECT space_id, start_time, end_time
+            FROM time_slots
+            WHERE status = 'available' AND space_id IN ({placeholders})
+            ORDER BY space_id, start_time
+        ''', list(windows))
+        slots_by_room = {}
+        for space_id, start_time, end_time in rows:
+            slots_by_room.setdefault(space_id, []).append((start_time, end_time))
+        for space_id, slots in slots_by_room.items():
+            windows[space_id] = free_windows(slots)
+        return windows
+
+    def export(self, full=False):
+        """重新生成校验和变化了的订阅源，返回统计"""
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        old_rooms, old_gids = self.manifest['rooms'], self.manifest['gids']
+
+        with get_read_pool(self.db_name).snapshot() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            rooms = {space_id: (gid, room_name) for space_id, gid, room_name in
+                     conn.execute('SELECT space_id, gid, room_name FROM rooms')}
+            changed = None if full else self._changed_rooms(conn, version)
+
+            # 待检查：变化过的房间、新房间、名称或gid变了的房间、文件丢失的房间
+            candidates = set(rooms) if changed is None else {
+                space_id for space_id, (gid, _) in rooms.items()
+                if space_id in changed or space_id not in old_rooms or old_rooms[space_id][0] != gid
+                or not os.path.exists(self.path(room_feed_name(space_id)))
+            }
+            windows = self._load_windows(conn, candidates)
+
+            new_rooms = {space_id: entry for space_id, entry in old_rooms.items() if space_id in rooms}
+            affected_gids = {old_rooms[space_id][0] for space_id in old_rooms if space_id not in rooms}
+            written = 0
+            for space_id in sorted(candidates):
+                gid, room_name = rooms[space_id]
+                checksum = windows_checksum(room_name, windows[space_id])
+                if old_rooms.get(space_id) == (gid, checksum) and not full:
+                    continue
+                events = room_events(space_id, room_name, windows[space_id], stamp)
+                write_file(self.path(room_feed_name(space_id)), render_calendar(room_name, events).encode('utf-8'))
+                written += 1
+                new_rooms[space_id] = (gid, checksum)
+                affected_gids.add(gid)
+                if space_id in old_rooms:
+                    affected_gids.add(old_rooms[space_id][0])
+
+            members = {}
+            for space_id, (gid, _) in rooms.items():
+                members.setdefault(gid, []).append(space_id)
+            affected_gids |= {gid for gid in members if not os.path.exists(self.path(gid_feed_name(gid)))}
+
+            # gid订阅源的校验和由成员房间的校验和组成，成员房间有变化才重新生成
+            new_gids = {gid: checksum for gid, checksum in old_gids.items() if gid in members}
+            for gid in sorted(affected_gids):
+                if gid not in members:
+                    continue
+                room_ids = sorted(members[gid])
+                checksum = hashlib.sha1(
+                    ''.join(new_rooms[space_id][1] for space_id in room_ids).encode()
+                ).hexdigest()[:16]
+                if old_gids.get(gid) == checksum and not full:
+                    continue
+                windows.update(self._load_windows(conn, [space_id for space_id in room_ids if space_id not in windows]))
+                events = []
+                for space_id in room_ids:
+                    events.extend(room_events(space_id, rooms[space_id][1], windows[space_id], stamp))
+                write_file(self.path(gid_feed_name(gid)), render_calendar(f'UofT study rooms (gid {gid})', events).encode('utf-8'))
+                written += 1
+                new_gids[gid] = checksum
+
+        # 删除已经不存在的房间和gid的订阅源
+        for name in [room_feed_name(space_id) for space_id in old_rooms if space_id not in new_rooms] + \
+                    [gid_feed_name(gid) for gid in old_gids if gid not in new_gids]:
+            if os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+
+        manifest = {'version': version, 'rooms': new_rooms, 'gids': new_gids}
+        self._save_manifest(manifest)
+        self.manifest = manifest
+        return {
+            'version': version,
+            'checked': len(candidates),
+            'written': written,
+            'feeds': len(new_rooms) + len(new_gids),
+            'seconds': time.perf_counter() - start,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export free-room windows as iCalendar feeds')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--out', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--full', action='store_true', help='regenerate every feed')
+    args = parser.parse_args()
+
+    stats = IcsExporter(args.db, args.out).export(full=args.full)
+    print(f"Regenerated {stats['written']} of {stats['feeds']} feeds ({stats['checked']} rooms checked) "
+          f"in {stats['seconds']:.3f}s (version {stats['version']}) -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,25 @@ UofT Study Rooms - Desktop Application Launcher
 """
 import os
 import sys
+import sqlite3
 import subprocess
 import webbrowser
 import time
 import threading
+import logging
+import urllib.request
+import urllib.error
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
+# Streamlit health endpoints (newer versions first)
+HEALTH_PATHS = ("/_stcore/health", "/healthz")
+READY_TIMEOUT = 60
+LOG_MAX_BYTES = 1_000_000
+LOG_BACKUP_COUNT = 3
+PREWARM_TIMEOUT = 30
+
 def find_free_port():
     """Find a free port for Streamlit"""
     import socket
@@ -19,7 +32,79 @@ def find_free_port():
         port = s.getsockname()[1]
     return port
 
-def launch_streamlit():
+def wait_until_ready(port, process, timeout=READY_TIMEOUT):
+    """Poll the Streamlit health endpoint with a short backoff until it answers"""
+    delay = 0.05
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        for path in HEALTH_PATHS:
+            try:
+                with urllib.request.urlopen(f"http://localhost:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return True
+            except (urllib.error.URLError, OSError):
+                pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    return False
+
+def stream_logs(process, log_path):
+    """Copy the child's output to a rotating log file so its pipe never fills up"""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger = logging.getLogger("uoft_study_rooms.streamlit")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for line in iter(process.stdout.readline, b""):
+            logger.info(line.decode("utf-8", "replace").rstrip())
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+def prewarm_dashboard(script_dir):
+    """Build the pre-warm snapshot the app seeds its caches from"""
+    try:
+        import streamlit.logger
+        # Bare-mode cache warnings are expected outside the server
+        streamlit.logger.set_log_level("error")
+        import prewarm
+        started = time.monotonic()
+        count = prewarm.build_snapshot(str(script_dir / "uoft_study_rooms.db"))
+        print(f"🔥 Pre-rendered {count} schedule tables in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        print(f"⚠️ Could not pre-warm dashboard: {e}")
+
+def has_data(db_path):
+    """True if the database exists and holds time slots"""
+    if not db_path.exists():
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return conn.execute("SELECT 1 FROM time_slots LIMIT 1").fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+def background_refresh(script_dir):
+    """Incremental refresh of today + 2 weeks; open sessions pick it up from the change feed"""
+    try:
+        import script
+        start_date = datetime.now().strftime('%Y-%m-%d')
+        end_date = (datetime.now() + timedelta(weeks=2)).strftime('%Y-%m-%d')
+        print(f"🔄 Background refresh started: {start_date} ~ {end_date}")
+        script.check_all_rooms_availability_sqlite(start_date, end_date, str(script_dir / "uoft_study_rooms.db"))
+        print("✅ Background refresh finished")
+    except Exception as e:
+        print(f"⚠️ Background refresh failed: {e}")
+
+def launch_streamlit(refresh=False):
     """Launch Streamlit app"""
     # Get the directory where this script is located
     script_dir = Path(__file__).parent
@@ -39,18 +124,33 @@ def launch_streamlit():
     ]
     
     print(f"Starting UofT Study Rooms on http://localhost:{port}")
+    started = time.monotonic()
     
     # Start streamlit in background
     process = subprocess.Popen(cmd, 
                               stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
                               cwd=script_dir)
+    log_path = script_dir / "logs" / "streamlit.log"
+    sys.path.insert(0, str(script_dir))
+    threading.Thread(target=stream_logs, args=(process, log_path), daemon=True).start()
+    
+    # Pre-warm the dashboard while the server starts
+    prewarm_thread = threading.Thread(target=prewarm_dashboard, args=(script_dir,), daemon=True)
+    prewarm_thread.start()
     
-    # Wait a bit for server to start
-    time.sleep(3)
+    # Open browser as soon as the server is ready and the first view is warm
+    ready = wait_until_ready(port, process)
+    prewarm_thread.join(PREWARM_TIMEOUT)
     
-    # Open browser
-    webbrowser.open(f"http://localhost:{port}")
+    # Refresh in the background if asked to, or if there is nothing to show yet
+    if refresh or not has_data(script_dir / "uoft_study_rooms.db"):
+        threading.Thread(target=background_refresh, args=(script_dir,), daemon=True).start()
+    if ready:
+        print(f"⚡ Server ready in {time.monotonic() - started:.1f}s")
+        webbrowser.open(f"http://localhost:{port}")
+    else:
+        print(f"❌ Server did not become ready, see {log_path}")
     
     return process
 
@@ -69,8 +169,8 @@ def main():
                 input("Press Enter to exit...")
                 return
         
-        # Launch streamlit
-        process = launch_streamlit()
+        # Launch streamlit (--refresh also fetches the latest data in the background)
+        process = launch_streamlit(refresh="--refresh" in sys.argv[1:])
         
         print("✅ Application started successfully!")
         print("📱 Browser should open automatically")
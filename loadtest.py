@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仪表盘多用户压测：N个模拟用户通过streamlit的websocket协议连接同一个服务，
+不断切换gid、日期、视图和页码，统计每次rerun的延迟分位数和服务进程的CPU/内存
+
+压测:      python loadtest.py --users 50 --duration 60
+已有服务:  python loadtest.py --url http://host:8501 [--pid 服务进程号]
+回归检查:  python loadtest.py --users 20 --duration 30 --max-p95 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_USERS = 10
+DEFAULT_DURATION = 30.0
+# 两次操作之间的平均思考时间 (秒)
+DEFAULT_THINK = 1.0
+# 等待一次rerun完成的最长时间 (秒)
+RERUN_TIMEOUT = 60.0
+# 服务进程CPU/内存的采样间隔 (秒)
+SAMPLE_INTERVAL = 0.5
+# 模拟用户的操作及权重
+ACTIONS = (('gid', 0.35), ('date', 0.35), ('view', 0.15), ('page', 0.15))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, timeout=60.0):
+    """在后台启动 streamlit run app.py，健康检查通过后返回进程"""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', os.path.join(BASE_DIR, 'app.py'),
+         '--server.headless', 'true', '--server.port', str(port),
+         '--browser.gatherUsageStats', 'false'],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'streamlit exited with code {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'streamlit did not become healthy within {timeout:.0f}s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class ProcessSampler:
+    """后台线程定期读取 /proc/<pid>，记录CPU占用和常驻内存 (非Linux时不可用)"""
+
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    @property
+    def available(self):
+        return os.path.exists(f'/proc/{self.pid}/stat')
+
+    def read(self):
+        """返回 (CPU秒数, 常驻内存字节)"""
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{self.pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        # utime和stime是 ')' 之后的第12和13个字段
+        return (int(fields[11]) + int(fields[12])) / self._ticks, resident_pages * self._page_size
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                cpu, rss = self.read()
+            except OSError:
+                return
+            self.samples.append((time.perf_counter(), cpu, rss))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.available:
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def summary(self):
+        """平均/峰值CPU占用 (%，单核为100) 和内存 (MB)，样本不足时返回None"""
+        if len(self.samples) < 2:
+            return None
+        (t0, cpu0, rss0), (t1, cpu1, rss1) = self.samples[0], self.samples[-1]
+        peaks = [
+            (c2 - c1) / (u2 - u1) * 100
+            for (u1, c1, _), (u2, c2, _) in zip(self.samples, self.samples[1:]) if u2 > u1
+        ]
+        return {
+            'cpu_avg': (cpu1 - cpu0) / (t1 - t0) * 100,
+            'cpu_peak': max(peaks, default=0.0),
+            'rss_start': rss0 / 2 ** 20,
+            'rss_peak': max(rss for _, _, rss in self.samples) / 2 ** 20,
+            'rss_end': rss1 / 2 ** 20,
+        }
+
+
+class DashboardSession:
+    """一个模拟浏览器会话：通过 /_stcore/stream 发送rerun并等待脚本运行结束"""
+
+    WIDGET_TYPES = ('selectbox', 'radio', 'date_input', 'number_input', 'text_input')
+
+    def __init__(self, url):
+        self.url = url.rstrip('/').replace('http://', 'ws://').replace('https://', 'wss://') + '/_stcore/stream'
+        self.websocket = None
+        # 最近一次运行渲染出的控件 label -> (类型, proto)，控件id会随参数变化，每次运行后更新
+        self.widgets = {}
+        # 用户选择的控件值 label -> 值
+        self.values = {}
+
+    async def connect(self):
+        import websockets
+        self.websocket = await websockets.connect(self.url, subprotocols=['streamlit'], max_size=None)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    def widget_states(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+        states = WidgetStates()
+        for label, value in self.values.items():
+            if label not in self.widgets:
+                continue
+            kind, element = self.widgets[label]
+            state = states.widgets.add()
+            state.id = element.id
+            if kind in ('selectbox', 'radio'):
+                # 新版本按选项文本传值，旧版本按下标
+                if 'raw_value' in element.DESCRIPTOR.fields_by_name:
+                    state.string_value = value
+                else:
+                    state.int_value = list(element.options).index(value)
+            elif kind == 'date_input':
+                state.string_array_value.data.append(value)
+            elif kind == 'number_input':
+                if element.data_type == element.INT:
+                    state.int_value = int(value)
+                else:
+                    state.double_value = float(value)
+            else:
+                state.string_value = value
+        return states
+
+    async def rerun(self):
+        """发送当前控件值并等待本次运行结束，返回 (耗时秒数, 是否出错)"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.widget_states.CopyFrom(self.widget_states())
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+
+        widgets = {}
+        failed = False
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.websocket.recv(), RERUN_TIMEOUT))
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element_type = forward.delta.new_element.WhichOneof('type')
+                if element_type in self.WIDGET_TYPES:
+                    element = getattr(forward.delta.new_element, element_type)
+                    widgets[element.label] = (element_type, element)
+                elif element_type == 'exception':
+                    failed = True
+            elif kind == 'script_finished':
+                failed = failed or forward.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY
+                break
+        self.widgets = widgets
+        return time.perf_counter() - start, failed
+
+    def current(self, label):
+        """控件当前的值：用户选过的值，否则是页面渲染出的默认值"""
+        if label in self.values:
+            return self.values[label]
+        kind, element = self.widgets[label]
+        if kind in ('selectbox', 'radio'):
+            return element.options[element.default] if element.options else None
+        if kind == 'date_input':
+            return element.default[0] if element.default else None
+        return element.default
+
+    def choose(self, label, options):
+        """把label控件设为options中和当前值不同的一项，没有可选项时返回False"""
+        if label not in self.widgets:
+            return False
+        current = self.current(label)
+        options = [option for option in options if option != current]
+        if not options:
+            return False
+        self.values[label] = random.choice(options)
+        return True
+
+    def date_options(self):
+        if 'Select date' not in self.widgets:
+            return []
+        element = self.widgets['Select date'][1]
+        fmt = '%Y/%m/%d' if '/' in element.min else '%Y-%m-%d'
+        first, last = datetime.strptime(element.min, fmt), datetime.strptime(element.max, fmt)
+        return [(first + timedelta(days=n)).strftime(fmt) for n in range((last - first).days + 1)]
+
+    def act(self, action):
+        """执行一次用户操作 (修改控件值)，返回实际执行的操作名"""
+        if action == 'gid' and 'Select room type' in self.widgets:
+            if self.choose('Select room type', list(self.widgets['Select room type'][1].options)):
+                # 换了gid之后日期范围和页数都可能变化，回到默认值
+                self.values.pop('Select date', None)
+                self.values.pop('Page', None)
+                return 'gid'
+        if action == 'view' and self.choose('View', ['Day', 'Week']):
+            return 'view'
+        if action == 'page' and 'Page' in self.widgets:
+            element = self.widgets['Page'][1]
+            if self.choose('Page', list(range(int(element.min), int(element.max) + 1))):
+                return 'page'
+        if self.choose('Select date', self.date_options()):
+            return 'date'
+        return 'rerun'
+
+
+async def simulate_user(url, deadline, think, latencies, errors):
+    """一个模拟用户：打开页面，然后不断操作直到deadline"""
+    session = DashboardSession(url)
+    try:
+        await session.connect()
+        action = 'load'
+        while True:
+            elapsed, failed = await session.rerun()
+            latencies.setdefault(action, []).append(elapsed)
+            if failed:
+                errors.append(action)
+            if time.time() + think >= deadline:
+                break
+            await asyncio.sleep(random.expovariate(1 / think) if think > 0 else 0)
+            action = session.act(random.choices([a for a, _ in ACTIONS], [w for _, w in ACTIONS])[0])
+    except Exception as e:
+        errors.append(f'{type(e).__name__}: {e}')
+    finally:
+        await session.close()
+
+
+async def run_load(url, users, duration, think, ramp):
+    """启动users个模拟用户 (在ramp秒内陆续进入)，返回 (各操作延迟, 错误列表)"""
+    latencies, errors = {}, []
+    deadline = time.time() + duration
+
+    async def delayed(n):
+        await asyncio.sleep(ramp * n / users)
+        await simulate_user(url, deadline, think, latencies, errors)
+
+    await asyncio.gather(*(delayed(n) for n in range(users)))
+    return latencies, errors
+
+
+def percentile(values, p):
+    """values已排序；最近秩法"""
+    return values[max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))]
+
+
+def print_report(latencies, errors, elapsed, server, client_cpu):
+    print(f"{'action':<8} {'count':>7} " + ' '.join(f"{f'p{p}':>8}" for p in PERCENTILES) + f" {'max':>8}")
+    everything = sorted(value for values in latencies.values() for value in values)
+    for action, values in sorted(latencies.items()) + [('all', everything)]:
+        values = sorted(values)
+        if not values:
+            continue
+        print(f"{action:<8} {len(values):>7} "
+              + ' '.join(f"{percentile(values, p) * 1000:7.0f}ms" for p in PERCENTILES)
+              + f" {values[-1] * 1000:7.0f}ms")
+    print(f"\n{len(everything)} reruns in {elapsed:.1f}s ({len(everything) / elapsed:.1f}/s), {len(errors)} errors")
+    for error in sorted(set(errors))[:5]:
+        print(f"  {error}")
+    if server is not None:
+        print(f"Server CPU: avg {server['cpu_avg']:.0f}%, peak {server['cpu_peak']:.0f}% (100% = one core)")
+        print(f"Server RSS: {server['rss_start']:.0f}MB at start, peak {server['rss_peak']:.0f}MB, "
+              f"{server['rss_end']:.0f}MB at end")
+    else:
+        print("Server CPU/RSS: unavailable (needs /proc and the server pid)")
+    print(f"Load generator CPU: {client_cpu:.1f}s")
+    return everything
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-user load test for the Streamlit dashboard')
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='seconds of load')
+    parser.add_argument('--think', type=float, default=DEFAULT_THINK, help='mean pause between actions (s)')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which users join')
+    parser.add_argument('--url', help='existing server (default: start streamlit run app.py)')
+    parser.add_argument('--pid', type=int, help='server pid for CPU/RSS sampling when using --url')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--max-p95', type=float, help='fail (non-zero exit) if overall p95 exceeds this (s)')
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("loadtest.py needs the websockets package: pip install websockets")
+    random.seed(args.seed)
+
+    server_process = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        port = free_port()
+        print(f"Starting streamlit on port {port}...")
+        server_process = start_server(port)
+        url, pid = f'http://127.0.0.1:{port}', server_process.pid
+
+    sampler = ProcessSampler(pid) if pid else None
+    print(f"{args.users} users for {args.duration:.0f}s against {url}")
+    try:
+        if sampler is not None:
+            sampler.start()
+        start = time.perf_counter()
+        latencies, errors = asyncio.run(run_load(url, args.users, args.duration, args.think, args.ramp))
+        elapsed = time.perf_counter() - start
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server_process is not None:
+            stop_server(server_process)
+
+    everything = print_report(
+        latencies, errors, elapsed,
+        sampler.summary() if sampler is not None else None,
+        time.process_time()
+    )
+    if args.max_p95 is not None:
+        p95 = percentile(everything, 95) if everything else float('inf')
+        if p95 > args.max_p95 or errors:
+            print(f"❌ p95 {p95:.3f}s (budget {args.max_p95:.2f}s), {len(errors)} errors")
+            sys.exit(1)
+        print(f"✅ p95 {p95:.3f}s (budget {args.max_p95:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Pre-warm snapshot for the dashboard.
+
+launcher.py builds it while Streamlit starts: the rooms/slots frames plus the
+default day table of every room type, keyed by the DB file and its version. app.py seeds its
+slot store and fragment cache from it, so the first page view renders without
+touching the database.
+"""
+import os
+import pickle
+
+from db_pool import db_file_identity
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_FILE = os.path.join(BASE_DIR, ".cache", "prewarm.pickle")
+DEFAULT_DB = os.path.join(BASE_DIR, "uoft_study_rooms.db")
+
+def load_snapshot(path=SNAPSHOT_FILE, db_name=DEFAULT_DB):
+    """Return the snapshot dict, or None if missing, unreadable or built from another DB file
+
+    A deleted and recreated DB starts counting versions again, so the version
+    alone would match a stale snapshot; the file identity tells them apart.
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, AttributeError, ImportError):
+        return None
+    if snapshot.get("db_identity") is None or snapshot["db_identity"] != db_file_identity(db_name):
+        return None
+    return snapshot
+
+def save_snapshot(snapshot, path=SNAPSHOT_FILE):
+    """Write the snapshot atomically so the app never reads a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def build_snapshot(db_name=DEFAULT_DB, path=SNAPSHOT_FILE):
+    """Load the DB and render the default day table for each room type; returns the rendered count"""
+    import app
+
+    # Taken before reading: if the file is replaced meanwhile the snapshot just won't match
+    identity = db_file_identity(db_name)
+    version = app.get_db_version(db_name)
+    if version is None:
+        return 0
+    rooms_df, slots_df = app.load_data_from_db(db_name)
+    if rooms_df.empty or slots_df.empty:
+        return 0
+
+    max_rooms = app.ROOMS_PER_PAGE_OPTIONS[app.DEFAULT_PAGE_SIZE_INDEX]
+    fragments = {}
+    for gid in app.GID_OPTIONS.values():
+        filtered_slots_df = slots_df if gid is None else slots_df[slots_df["gid"] == gid]
+        if filtered_slots_df.empty:
+            continue
+        # Same default date and page the dashboard opens with
+        selected_date = min(filtered_slots_df["date"].unique())
+        html = app.create_schedule_table(filtered_slots_df, selected_date, max_rooms, 0)
+        if html:
+            fragments[(version, selected_date, gid, max_rooms, 0, None)] = html
+
+    save_snapshot({
+        "db_identity": identity,
+        "version": version,
+        "rooms_df": rooms_df,
+        "slots_df": slots_df,
+        "fragments": fragments,
+    }, path)
+    return len(fragments)
+
+if __name__ == "__main__":
+    print(f"Pre-rendered {build_snapshot()} tables into {SNAPSHOT_FILE}")
@@ -7,22 +7,15 @@
 import sqlite3
 from datetime import datetime
 
+from query_service import call
+
 def query_room_data(room_identifier, target_date):
-    """查询房间在指定日期的数据"""
-    
-    db_name = 'uoft_study_rooms.db'
+    """查询房间在指定日期的数据 (查询服务运行时通过服务查询，否则直接读数据库)"""
     
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-        
-        # 查找房间 - 支持按ID或名称搜索
-        if room_identifier.isdigit():
-            cursor.execute('SELECT space_id, room_name, gid FROM rooms WHERE space_id = ?', (int(room_identifier),))
-        else:
-            cursor.execute('SELECT space_id, room_name, gid FROM rooms WHERE room_name LIKE ?', (f'%{room_identifier}%',))
-        
-        rooms = cursor.fetchall()
+        # 查找房间 - 支持按ID或名称模糊搜索 (如 "GSR 2D"、"2253")
+        data = call('room_slots', room=room_identifier, date=target_date)
+        rooms = data['rooms']
         
         print('🔍 房间搜索结果:')
         print('=' * 50)
@@ -31,24 +24,17 @@ def query_room_data(room_identifier, target_date):
             return
         
         for room in rooms:
-            print(f'📍 ID: {room[0]}, Name: {room[1]}, GID: {room[2]}')
+            print(f'📍 ID: {room["space_id"]}, Name: {room["room_name"]}, GID: {room["gid"]}')
         
         # 使用第一个匹配的房间
-        space_id = rooms[0][0]
-        room_name = rooms[0][1]
+        space_id = rooms[0]['space_id']
+        room_name = rooms[0]['room_name']
         
         print(f'\n📅 查询房间 {space_id} ({room_name}) 在 {target_date} 的时间槽:')
         print('=' * 60)
         
-        # 查询指定日期的时间槽
-        cursor.execute('''
-            SELECT start_time, end_time, status, query_date 
-            FROM time_slots 
-            WHERE space_id = ? AND query_date = ?
-            ORDER BY start_time
-        ''', (space_id, target_date))
-        
-        slots = cursor.fetchall()
+        # 指定日期的时间槽
+        slots = data['slots']
         
         if slots:
             available_count = 0
@@ -73,14 +59,13 @@ def query_room_data(room_identifier, target_date):
         else:
             print(f'❌ 没有找到 {target_date} 的数据')
             
-            # 查看该房间所有可用的日期
-            cursor.execute('SELECT DISTINCT query_date FROM time_slots WHERE space_id = ? ORDER BY query_date', (space_id,))
-            available_dates = cursor.fetchall()
+            # 该房间所有可用的日期
+            available_dates = data['dates']
             
             if available_dates:
                 print(f'\n📆 该房间可用的日期:')
                 for date in available_dates:
-                    print(f'   📅 {date[0]}')
+                    print(f'   📅 {date}')
             else:
                 print('   ⚠️  数据库中没有该房间的任何时间槽数据')
         
@@ -88,9 +73,6 @@ def query_room_data(room_identifier, target_date):
         print(f'❌ 数据库错误: {e}')
     except Exception as e:
         print(f'❌ 发生错误: {e}')
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == '__main__':
     # 查询房间2253在2025-09-27的数据
@@ -99,4 +81,4 @@ if __name__ == '__main__':
     print('\n' + '='*60)
     
     # 也可以按名称搜索
-    query_room_data('GSR 2D', '2025-09-27')
\ No newline at end of file
+    query_room_data('GSR 2D', '2025-09-27')
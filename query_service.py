@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地查询服务：常驻进程持有只读数据库连接和结果缓存，命令行工具通过Unix socket查询
+
+启动服务:  python query_service.py serve
+查询房间:  python query_service.py room "GSR 2D" 2025-09-27
+房间统计:  python query_service.py stats 35838
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from db_pool import ReadPool
+from room_catalog import get_room_catalog
+from room_search import search_rooms
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'uoft_study_rooms.sock')
+
+# 结果缓存的最大条目数，数据库版本变化时整体清空
+RESULT_CACHE_SIZE = 1024
+
+
+class QueryServiceError(Exception):
+    """查询服务返回的错误"""
+
+
+def room_to_dict(record):
+    return {
+        'space_id': record.space_id,
+        'room_name': record.room_name,
+        'gid': record.gid,
+        'capacity': record.capacity,
+        'url': record.url,
+    }
+
+
+class QueryHandler:
+    """持有一个只读连接 (db_pool.ReadPool) 和结果缓存，执行所有查询"""
+
+    def __init__(self, db_name=DEFAULT_DB):
+        self.db_name = db_name
+        # 查询在self._lock下串行执行，一个连接就够了；数据库文件被重建时ReadPool会重新连接
+        self._pool = ReadPool(db_name, size=1)
+        self._lock = threading.Lock()
+        self._version = None
+        self._cache = {}
+
+    def close(self):
+        with self._lock:
+            self._pool.close()
+
+    def dispatch(self, method, params):
+        """执行查询；同一数据库版本内相同的请求直接返回缓存结果"""
+        handler = getattr(self, f'q_{method}', None)
+        if handler is None:
+            raise QueryServiceError(f'unknown method: {method}')
+
+        # 版本号和查询结果在同一个读事务中读取，中途发布的新版本不会混进来
+        with self._lock, self._pool.snapshot() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+
+            key = (method, json.dumps(params, sort_keys=True))
+            if key in self._cache:
+                return self._cache[key]
+            result = handler(conn, **params)
+            if len(self._cache) >= RESULT_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = result
+            return result
+
+    def q_ping(self, conn):
+        return {'version': self._version, 'db_name': self.db_name}
+
+    def q_search(self, conn, query, limit=10):
+        return [room_to_dict(record) for record in search_rooms(query, limit=limit)]
+
+    def q_room_slots(self, conn, room, date):
+        """按ID或名称查找房间，返回第一个匹配房间在指定日期的时间槽"""
+        rooms = search_rooms(str(room))
+        result = {'rooms': [room_to_dict(record) for record in rooms], 'slots': [], 'dates': []}
+        if not rooms:
+            return result
+
+        space_id = rooms[0].space_id
+        next_day = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        result['slots'] = conn.execute('''
+            SELECT start_time, end_time, status
+            FROM time_slots
+            WHERE space_id = ? AND start_time >= ? AND start_time < ?
+            ORDER BY start_time
+        ''', (space_id, date, next_day)).fetchall()
+
+        # 没有该日期的数据时返回该房间所有有数据的日期
+        if not result['slots']:
+            result['dates'] = [row[0] for row in conn.execute('''
+                SELECT DISTINCT substr(start_time, 1, 10) FROM time_slots
+                WHERE space_id = ? ORDER BY 1
+            ''', (space_id,))]
+        return result
+
+    def q_room_stats(self, conn, space_id):
+        """房间元数据和时间槽统计；房间不存在时返回目录概况"""
+        catalog = get_room_catalog()
+        record = catalog.get(int(space_id))
+        result = {'room': room_to_dict(record) if record else None}
+        if record:
+            count, min_date, max_date = conn.execute('''
+                SELECT COUNT(*), MIN(query_date), MAX(query_date) FROM time_slots WHERE space_id = ?
+            ''', (record.space_id,)).fetchone()
+            result.update(count=count, min_date=min_date, max_date=max_date)
+        else:
+            space_ids = sorted(catalog.by_id)
+            result['catalog'] = {
+                'count': len(space_ids),
+                'min_id': space_ids[0] if space_ids else None,
+                'max_id': space_ids[-1] if space_ids else None,
+                'first': [[space_id, catalog.get(space_id).room_name] for space_id in space_ids[:5]],
+            }
+        return result
+
+    def q_dates(self, conn):
+        return conn.execute('''
+            SELECT substr(start_time, 1, 10), COUNT(*) FROM time_slots
+            GROUP BY 1 ORDER BY 1
+        ''').fetchall()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """每行一个JSON请求，一个连接上可以连续发送多个请求"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                result = self.server.query_handler.dispatch(request['method'], request.get('params') or {})
+                response = {'ok': True, 'result': result}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, query_handler):
+        self.query_handler = query_handler
+        super().__init__(socket_path, _RequestHandler)
+
+
+def serve(db_name=DEFAULT_DB, socket_path=DEFAULT_SOCKET):
+    """启动查询服务，直到Ctrl+C"""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    query_handler = QueryHandler(db_name)
+    # 预热：打开连接并加载房间目录和搜索索引
+    query_handler.dispatch('ping', {})
+    search_rooms('warm up')
+
+    server = QueryServer(socket_path, query_handler)
+    # 被kill时也能清理socket文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Query service listening on {socket_path} (db: {db_name})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping query service...")
+    finally:
+        server.server_close()
+        query_handler.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class QueryClient:
+    """查询服务客户端，复用同一个socket连接"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=5.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._file = self._sock.makefile('rb')
+
+    def call(self, method, **params):
+        self._sock.sendall(json.dumps({'method': method, 'params': params}).encode('utf-8') + b'\n')
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('query service closed the connection')
+        response = json.loads(line)
+        if not response['ok']:
+            raise QueryServiceError(response['error'])
+        return response['result']
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+_local_handler = None
+
+
+def call(method, socket_path=DEFAULT_SOCKET, **params):
+    """优先通过查询服务执行；服务没有运行时在当前进程内直接查询"""
+    global _local_handler
+    if os.path.exists(socket_path):
+        try:
+            client = QueryClient(socket_path)
+        except OSError:
+            pass
+        else:
+            try:
+                return client.call(method, **params)
+            finally:
+                client.close()
+
+    if _local_handler is None:
+        _local_handler = QueryHandler()
+    # 本地执行时结果经过一次JSON往返，和服务返回的格式保持一致
+    return json.loads(json.dumps(_local_handler.dispatch(method, params)))
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('serve', 'room', 'stats', 'search'):
+        print(__doc__)
+        return
+
+    command = sys.argv[1]
+    if command == 'serve':
+        serve(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB)
+    elif command == 'room':
+        from query_room import query_room_data
+        query_room_data(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else datetime.now().strftime('%Y-%m-%d'))
+    elif command == 'stats':
+        print(json.dumps(call('room_stats', space_id=int(sys.argv[2])), ensure_ascii=False, indent=2))
+    elif command == 'search':
+        for room in call('search', query=' '.join(sys.argv[2:])):
+            print(f"{room['space_id']}: {room['room_name']} (gid {room['gid']})")
+
+
+if __name__ == '__main__':
+    main()
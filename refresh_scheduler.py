@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按预订变化频率分配抓取预算的增量刷新调度器
+
+每个 (房间, 日期) 切片记录变化率 (每小时状态变化数，指数滑动平均)。每一轮按
+"上次刷新以来预计累积的变化数" 排序，只抓取最值得刷新的切片：近几天和热门房间
+几分钟刷新一次，两周后的冷门切片很少刷新。
+
+单轮运行:  python refresh_scheduler.py --once
+持续运行:  python refresh_scheduler.py --budget 60 --interval 300
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from script import (
+    fetch_rooms_for_date,
+    get_available_rooms_from_sqlite,
+    get_refresh_window,
+    init_sqlite_database,
+    publish_lock,
+    record_refresh,
+    replace_slots_with_changes,
+    shadow_database,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+
+# 调度的日期范围 (天)
+HORIZON_DAYS = 14
+# 每轮最多抓取的切片数
+DEFAULT_BUDGET = 60
+# 两轮之间的间隔 (秒)
+DEFAULT_INTERVAL = 300
+# 同一切片两次刷新的最短间隔和最长间隔 (小时)
+MIN_REFRESH_HOURS = 5 / 60
+MAX_STALENESS_HOURS = 12
+# 没有历史数据时的先验变化率：当天每小时PRIOR_RATE次，越远的日期越低
+PRIOR_RATE = 2.0
+# 变化率滑动平均的权重
+RATE_ALPHA = 0.3
+
+
+def prior_rate(days_ahead):
+    return PRIOR_RATE / (1 + days_ahead)
+
+
+def load_stats(conn):
+    """返回 {(space_id, query_date): (last_refreshed, refresh_count, change_count, change_rate)}"""
+    return {
+        (space_id, query_date): (last_refreshed, refresh_count, change_count, change_rate)
+        for space_id, query_date, last_refreshed, refresh_count, change_count, change_rate in conn.execute('''
+            SELECT space_id, query_date, last_refreshed, refresh_count, change_count, change_rate FROM refresh_stats
+        ''')
+    }
+
+
+def seed_rates(conn):
+    """用变更日志估计还没有统计的切片的变化率 (变化数 / 日志覆盖的小时数)"""
+    first, last = conn.execute('''
+        SELECT MIN(strftime('%s', published_at)), MAX(strftime('%s', published_at)) FROM refresh_log
+    ''').fetchone()
+    if first is None or last is None or int(last) <= int(first):
+        return {}
+    span_hours = (int(last) - int(first)) / 3600
+    return {
+        (space_id, query_date): count / span_hours
+        for space_id, query_date, count in conn.execute('''
+            SELECT space_id, query_date, COUNT(*) FROM slot_changes GROUP BY space_id, query_date
+        ''')
+    }
+
+
+def plan_refresh(rooms, stats, seeds, now, budget=DEFAULT_BUDGET, horizon_days=HORIZON_DAYS):
+    """选出本轮要刷新的切片，返回 [(score, query_date, room)]，按得分从高到低
+
+    得分 = 估计变化率 × 距上次刷新的小时数；从未刷新或超过MAX_STALENESS_HOURS的切片优先
+    """
+    today = datetime.fromtimestamp(now).date()
+    candidates = []
+    for days_ahead in range(horizon_days):
+        query_date = (today + timedelta(days=days_ahead)).strftime('%Y-%m-%d')
+        for room in rooms:
+            key = (room[0], query_date)
+            stat = stats.get(key)
+            if stat is None or stat[0] is None:
+                # 从未刷新：近的日期先刷
+                candidates.append((float('inf'), -days_ahead, query_date, room))
+                continue
+            hours = (now - stat[0]) / 3600
+            if hours < MIN_REFRESH_HOURS:
+                continue
+            rate = stat[3] if stat[3] is not None else seeds.get(key, prior_rate(days_ahead))
+            score = float('inf') if hours >= MAX_STALENESS_HOURS else rate * hours
+            candidates.append((score, -days_ahead, query_date, room))
+    candidates.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    return [(score, query_date, room) for score, _, query_date, room in candidates[:budget]]
+
+
+def update_stats(stats, seeds, space_id, query_date, change_count, now):
+    """刷新后更新切片的变化率 (只更新stats，由save_stats写入数据库)"""
+    key = (space_id, query_date)
+    last_refreshed, refresh_count, total_changes, rate = stats.get(key, (None, 0, 0, None))
+    days_ahead = (datetime.strptime(query_date, '%Y-%m-%d').date() - datetime.fromtimestamp(now).date()).days
+    if rate is None:
+        rate = seeds.get(key, prior_rate(days_ahead))
+    if last_refreshed is not None:
+        observed = change_count / max((now - last_refreshed) / 3600, MIN_REFRESH_HOURS)
+        rate = RATE_ALPHA * observed + (1 - RATE_ALPHA) * rate
+    stats[key] = (now, refresh_count + 1, total_changes + change_count, rate)
+
+
+def save_stats(cursor, stats, keys, now):
+    """把本轮刷新过的切片统计写入refresh_stats，并删除已经过去的日期"""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO refresh_stats
+        (space_id, query_date, last_refreshed, refresh_count, change_count, change_rate)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(*key, *stats[key]) for key in keys])
+    cursor.execute('DELETE FROM refresh_stats WHERE query_date < ?', (datetime.fromtimestamp(now).strftime('%Y-%m-%d'),))
+
+
+def run_cycle(db_name=DEFAULT_DB, budget=DEFAULT_BUDGET, horizon_days=HORIZON_DAYS, max_workers=8):
+    """执行一轮调度，所有写入和版本发布在影子数据库的一个事务中完成；返回本轮统计
+
+    没有要刷新的切片或刷新后没有任何变化时不发布新版本 (每次发布都会让读者的缓存失效)，
+    只把刷新统计写进正式数据库
+    """
+    rooms = get_available_rooms_from_sqlite(db_name)
+    if not rooms:
+        print("No rooms in the database, import the room catalog first")
+        return None
+
+    now = time.time()
+    conn = sqlite3.connect(db_name)
+    try:
+        stats = load_stats(conn)
+        seeds = seed_rates(conn)
+    finally:
+        conn.close()
+
+    plan = plan_refresh(rooms, stats, seeds, now, budget, horizon_days)
+    if not plan:
+        print("Refresh cycle: no slices due, nothing published")
+        return {'planned': 0, 'refreshed': 0, 'failed': 0, 'changes': 0, 'version': None, 'dates': 0}
+    rooms_by_date = {}
+    for _, query_date, room in plan:
+        rooms_by_date.setdefault(query_date, []).append(room)
+
+    # 抓取 (同一响应里顺带返回的房间也一并更新)
+    fetched = {}
+    failed = 0
+    for query_date, date_rooms in sorted(rooms_by_date.items()):
+        fetched[query_date], date_failed = fetch_rooms_for_date(date_rooms, query_date, max_workers)
+        failed += date_failed
+
+    known_gids = {space_id: gid for space_id, gid, _ in rooms}
+    refreshed = []
+    # 写入影子数据库，发布时在一个事务中复制进正式数据库
+    with shadow_database(db_name) as shadow_db:
+        conn = sqlite3.connect(shadow_db)
+        cursor = conn.cursor()
+        try:
+            base_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            version = base_version + 1
+            for query_date, slots_by_room in fetched.items():
+                window = get_refresh_window(query_date, query_date, [])
+                for space_id, slots in slots_by_room.items():
+                    if space_id not in known_gids:
+                        continue
+                    change_count = replace_slots_with_changes(cursor, space_id, known_gids[space_id], slots, window, query_date, version)
+                    update_stats(stats, seeds, space_id, query_date, change_count, now)
+                    refreshed.append((space_id, query_date))
+            change_count = cursor.execute('SELECT COUNT(*) FROM slot_changes WHERE version = ?', (version,)).fetchone()[0]
+            if change_count:
+                save_stats(cursor, stats, refreshed, now)
+                record_refresh(cursor, version)
+                conn.commit()
+            else:
+                # user_version没有变化，退出时影子库直接丢弃
+                conn.rollback()
+                version = base_version
+        finally:
+            conn.close()
+
+    if not change_count:
+        with publish_lock(db_name):
+            conn = sqlite3.connect(db_name)
+            try:
+                save_stats(conn.cursor(), stats, refreshed, now)
+                conn.commit()
+            finally:
+                conn.close()
+
+    result = {
+        'planned': len(plan),
+        'refreshed': len(refreshed),
+        'failed': failed,
+        'changes': change_count,
+        'version': version,
+        'dates': len(rooms_by_date),
+    }
+    print(f"Refresh cycle: {len(refreshed)} slices refreshed ({len(plan)} planned over {len(rooms_by_date)} dates), "
+          f"{failed} failed, {change_count} changed slots, version {version}"
+          f"{'' if change_count else ' (unchanged, nothing published)'}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Churn-based incremental refresh scheduler')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET, help='room/date slices fetched per cycle')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL, help='seconds between cycles')
+    parser.add_argument('--horizon', type=int, default=HORIZON_DAYS, help='days ahead to keep fresh')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--once', action='store_true', help='run a single cycle and exit')
+    args = parser.parse_args()
+
+    init_sqlite_database(args.db)
+    try:
+        while True:
+            run_cycle(args.db, args.budget, args.horizon, args.workers)
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nStopping refresh scheduler...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+房间元数据目录：每个进程只从CSV加载一次，按space_id、gid和名称建立索引
+"""
+
+import csv
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class RoomRecord:
+    """单个房间的元数据"""
+
+    __slots__ = ('space_id', 'room_name', 'capacity', 'gid', 'url')
+
+    def __init__(self, space_id, room_name, capacity, gid, url):
+        self.space_id = space_id
+        self.room_name = room_name
+        self.capacity = capacity
+        self.gid = gid
+        self.url = url
+
+    @classmethod
+    def from_csv_row(cls, row):
+        return cls(
+            int(row['space_id']),
+            row['room_name'],
+            int(row['capacity_found_at']),
+            int(row['gid']),
+            row['url']
+        )
+
+    def as_row(self):
+        """按rooms表的列顺序返回 (space_id, room_name, capacity_found_at, gid, url)"""
+        return (self.space_id, self.room_name, self.capacity, self.gid, self.url)
+
+    def __repr__(self):
+        return f"RoomRecord({self.space_id}, {self.room_name!r}, gid={self.gid})"
+
+
+class RoomCatalog:
+    """房间目录，提供按space_id、gid和名称的索引"""
+
+    def __init__(self, records=(), source=None):
+        self.source = source
+        self.by_id = {}
+        self.by_gid = {}
+        self.by_name = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_csv(cls, csv_filename):
+        with open(csv_filename, 'r', encoding='utf-8') as csvfile:
+            return cls((RoomRecord.from_csv_row(row) for row in csv.DictReader(csvfile)), source=csv_filename)
+
+    def add(self, record):
+        """加入或替换一个房间，同时更新所有索引"""
+        previous = self.by_id.get(record.space_id)
+        if previous is not None:
+            self.by_gid[previous.gid].remove(previous)
+            self.by_name[previous.room_name.lower()].remove(previous)
+        self.by_id[record.space_id] = record
+        self.by_gid.setdefault(record.gid, []).append(record)
+        self.by_name.setdefault(record.room_name.lower(), []).append(record)
+
+    def get(self, space_id, default=None):
+        return self.by_id.get(space_id, default)
+
+    def rooms_for_gid(self, gid):
+        return list(self.by_gid.get(gid, ()))
+
+    def find_by_name(self, name):
+        """按名称精确匹配 (不区分大小写)"""
+        return list(self.by_name.get(name.lower(), ()))
+
+    def gid_of(self, space_id, default=0):
+        record = self.by_id.get(space_id)
+        return record.gid if record else default
+
+    def __contains__(self, space_id):
+        return space_id in self.by_id
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+def get_latest_csv_file():
+    """获取最新的房间CSV文件"""
+    csv_files = [f for f in os.listdir(BASE_DIR) if f.startswith('uoft_study_rooms') and f.endswith('.csv')]
+    if not csv_files:
+        return None
+    # 按文件名排序，最新的在最后
+    csv_files.sort()
+    return os.path.join(BASE_DIR, csv_files[-1])
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_room_catalog(csv_filename=None):
+    """返回进程内共享的房间目录；CSV文件被改写后才会重新加载"""
+    csv_filename = csv_filename or get_latest_csv_file()
+    if not csv_filename:
+        return RoomCatalog()
+
+    csv_filename = os.path.abspath(csv_filename)
+    mtime = os.stat(csv_filename).st_mtime_ns
+    with _catalogs_lock:
+        cached = _catalogs.get(csv_filename)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, RoomCatalog.from_csv(csv_filename))
+            _catalogs[csv_filename] = cached
+        return cached[1]
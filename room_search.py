@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+房间名称模糊搜索：规范化分词、缩写展开和三元组(trigram)匹配，索引在内存中预先构建
+"""
+
+import re
+import threading
+
+from room_catalog import get_room_catalog
+
+# 常见缩写展开 (查询和房间名称两边都会展开)
+ALIASES = {
+    'gsr': ('group', 'study', 'room'),
+    'isr': ('individual', 'study', 'room'),
+    'rm': ('room',),
+    'fl': ('floor',),
+    'flr': ('floor',),
+    'lib': ('library',),
+}
+
+# 每个索引缓存的查询结果数量
+QUERY_CACHE_SIZE = 256
+
+_TOKEN_RE = re.compile(r'[a-z]+|\d+[a-z]*')
+
+
+def tokenize(text):
+    """小写、按字母/数字边界切分，并展开缩写"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.extend(ALIASES.get(token, (token,)))
+    return tokens
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RoomSearchIndex:
+    """基于房间目录构建的搜索索引"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._results = {}
+        self._records = []
+        self._tokens = []
+        # 词表级别的索引：三元组 -> 词，词 -> 房间位置
+        self._token_trigrams = {}
+        self._trigram_tokens = {}
+        self._token_rooms = {}
+        for record in catalog:
+            position = len(self._records)
+            tokens = tokenize(record.room_name)
+            self._records.append(record)
+            self._tokens.append(tokens)
+            for token in tokens:
+                self._token_rooms.setdefault(token, set()).add(position)
+                if token not in self._token_trigrams:
+                    grams = trigrams(token)
+                    self._token_trigrams[token] = grams
+                    for gram in grams:
+                        self._trigram_tokens.setdefault(gram, set()).add(token)
+
+    def _score_vocabulary(self, query_token):
+        """给词表中与查询词共享三元组的每个词打分 (完全匹配1.0，前缀0.9，否则三元组Jaccard)"""
+        query_grams = trigrams(query_token)
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self._trigram_tokens.get(gram, set())
+
+        scores = {}
+        for token in candidates:
+            if token == query_token:
+                scores[token] = 1.0
+            elif token.startswith(query_token):
+                scores[token] = 0.9
+            else:
+                grams = self._token_trigrams[token]
+                scores[token] = len(query_grams & grams) / len(query_grams | grams)
+        return scores
+
+    def search(self, query, limit=10, min_score=0.5, relative=0.85):
+        """返回按相关度排序的RoomRecord列表
+
+        只保留得分不低于min_score且不低于最高分*relative的结果；limit为None时不限制数量
+        """
+        key = (query.strip().lower(), limit, min_score, relative)
+        results = self._results.get(key)
+        if results is None:
+            results = self._search(key[0], limit, min_score, relative)
+            if len(self._results) >= QUERY_CACHE_SIZE:
+                self._results.clear()
+            self._results[key] = results
+        return list(results)
+
+    def _search(self, query, limit, min_score, relative):
+        if query.isdigit() and int(query) in self.catalog:
+            return [self.catalog.get(int(query))]
+
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        token_scores = [self._score_vocabulary(token) for token in query_tokens]
+
+        # 只对包含至少一个候选词的房间打分
+        candidates = set()
+        for scores in token_scores:
+            for token in scores:
+                candidates |= self._token_rooms[token]
+
+        scored = []
+        for position in candidates:
+            tokens = self._tokens[position]
+            score = sum(max(scores.get(token, 0.0) for token in tokens) for scores in token_scores) / len(query_tokens)
+            if score >= min_score:
+                scored.append((score, -len(tokens), position))
+        if not scored:
+            return []
+
+        scored.sort(reverse=True)
+        cutoff = scored[0][0] * relative
+        results = [self._records[position] for score, _, position in scored if score >= cutoff]
+        return results if limit is None else results[:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """返回共享房间目录对应的搜索索引；目录重新加载后自动重建"""
+    global _index
+    catalog = get_room_catalog()
+    with _index_lock:
+        if _index is None or _index.catalog is not catalog:
+            _index = RoomSearchIndex(catalog)
+        return _index
+
+
+def search_rooms(query, limit=10):
+    """按名称或ID模糊搜索房间，支持GSR等缩写"""
+    return get_search_index().search(query, limit=limit)
@@ -3,111 +3,109 @@ def check_all_rooms_availability_sqlite_from_json(json_path, db_name="uoft_study
     if not os.path.exists(json_path):
         print(f"can not find: {json_path}")
         return
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(json_path, 'rb') as f:
+        data = json_loads(f.read())
     if 'slots' not in data:
         print("JSON data structure is invalid, missing 'slots' field")
         return
-    # 读取房间元数据
-    csv_file = get_latest_csv_file()
-    room_meta = {}
-    if csv_file:
-        with open(csv_file, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                room_meta[int(row['space_id'])] = row
-    # 读取已存在的房间，避免重复
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute('SELECT space_id FROM rooms')
-    existing_rooms = set(row[0] for row in cursor.fetchall())
-    # 按itemId分组slots
-    slots_by_item = {}
-    for slot in data['slots']:
-        item_id = slot['itemId']
-        if filter_item_ids and item_id not in filter_item_ids:
-            continue
-        slots_by_item.setdefault(item_id, []).append(slot)
-    total_rooms = len(slots_by_item)
-    print(f"JSON includes {total_rooms} rooms with time slots")
-    imported = 0
-    for item_id, slots in slots_by_item.items():
-        # 插入房间元数据（如有）
-        if item_id not in existing_rooms:
-            meta = room_meta.get(item_id)
-            if meta:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    int(meta['space_id']),
-                    meta['room_name'],
-                    int(meta['capacity_found_at']),
-                    int(meta['gid']),
-                    meta['url']
-                ))
-                conn.commit()
-        # 处理时间槽
-        available_slots = []
-        unavailable_slots = []
-        for slot in slots:
-            slot_info = {
-                'start': slot['start'],
-                'end': slot['end'],
-                'item_id': slot['itemId'],
-                'checksum': slot.get('checksum', ''),
-            }
-            if 'className' not in slot or slot['className'] != 's-lc-eq-checkout':
-                slot_info['status'] = 'available'
-                available_slots.append(slot_info)
-            else:
-                slot_info['status'] = 'unavailable'
-                unavailable_slots.append(slot_info)
-        # 删除旧数据
-        query_date = slot['start'][:10] if slots else datetime.now().strftime('%Y-%m-%d')
-        cursor.execute('DELETE FROM time_slots WHERE space_id = ? AND query_date = ?', (item_id, query_date))
-        # 插入新数据
-        for slot in available_slots + unavailable_slots:
-            cursor.execute('''
-                INSERT INTO time_slots (space_id, gid, start_time, end_time, status, item_id, checksum, query_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item_id,
-                int(room_meta.get(item_id, {}).get('gid', 0)),
-                slot['start'],
-                slot['end'],
-                slot['status'],
-                slot['item_id'],
-                slot['checksum'],
-                slot['start'][:10]
-            ))
-        conn.commit()
-        imported += 1
-        print(f"Installed room {item_id} with {len(available_slots) + len(unavailable_slots)} time slots")
-    conn.close()
+    # 房间元数据 (进程内共享的目录)
+    catalog = get_room_catalog()
+    # 导入到影子数据库，全部完成后在一个事务中发布到正式数据库
+    with shadow_database(db_name) as shadow_db:
+        # 读取已存在的房间，避免重复
+        conn = sqlite3.connect(shadow_db)
+        cursor = conn.cursor()
+        cursor.execute('SELECT space_id FROM rooms')
+        existing_rooms = set(row[0] for row in cursor.fetchall())
+        # 按itemId分组解析slots
+        slots_by_item = parse_slots_by_item(data['slots'])
+        if filter_item_ids:
+            slots_by_item = {item_id: slots for item_id, slots in slots_by_item.items() if item_id in filter_item_ids}
+        total_rooms = len(slots_by_item)
+        print(f"JSON includes {total_rooms} rooms with time slots")
+        imported = 0
+        version = begin_refresh(shadow_db)
+        for item_id, slots in slots_by_item.items():
+            # 插入房间元数据（如有）
+            if item_id not in existing_rooms:
+                record = catalog.get(item_id)
+                if record:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', record.as_row())
+                    existing_rooms.add(item_id)
+            # 替换JSON覆盖的日期范围内的旧数据，并记录变化 (query_date按时间槽各自的日期)
+            first_date = min(slot[0] for slot in slots)[:10]
+            window = get_refresh_window(first_date, first_date, slots)
+            replace_slots_with_changes(cursor, item_id, catalog.gid_of(item_id), slots, window, None, version)
+            conn.commit()
+            imported += 1
+            print(f"Installed room {item_id} with {len(slots)} time slots")
+        conn.close()
+        publish_refresh(version, shadow_db)
     print(f"Batch import completed, processed {imported} rooms")
-import requests
 import json
 import csv
+import html
+import re
 import sqlite3
 from datetime import datetime, timedelta
 import time
 import os
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import zip_longest
 
-def fetch_room_availability_api_raw(space_id, gid, start_date=None, end_date=None):
-    """通过API获取指定房间的原始JSON数据"""
-    
-    # 如果没有指定日期，默认查询今天和明天
-    if not start_date:
-        start_date = datetime.now().strftime('%Y-%m-%d')
-    if not end_date:
-        end_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-    
-    print(f"正在获取房间 {space_id} (gid:{gid}) 从 {start_date} 到 {end_date} 的原始数据...")
-    
-    # API端点
-    api_url = "https://libcal.library.utoronto.ca/spaces/availability/grid"
-    
+from db_pool import get_read_pool
+from room_catalog import RoomRecord, get_latest_csv_file, get_room_catalog
+
+# 有orjson时用它解析API响应 (快数倍)，否则用标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# 发布锁用flock实现跨进程互斥；没有fcntl的平台 (Windows) 退化为进程内的锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+PUBLISH_THREAD_LOCK = threading.Lock()
+CRAWL_THREAD_LOCK = threading.Lock()
+
+# 所有图书馆的gid (与app.py中的选项一致)
+LIBRARY_GIDS = (7314, 7466, 7474, 7708, 7816, 7416, 7945, 7935, 7432, 7433, 7434, 7449, 7996, 7970)
+
+# 变更日志保留的刷新版本数，更早的读者需要重新全量加载
+CHANGE_FEED_RETENTION = 50
+
+# 长日期范围按CHUNK_DAYS天分块并行请求，失败的块最多重试CHUNK_RETRIES次
+CHUNK_DAYS = 3
+CHUNK_WORKERS = 4
+CHUNK_RETRIES = 2
+
+# 批量抓取流水线：抓取线程数、阶段之间有界队列的容量、每个事务最多写入的房间数、每个抓取线程两次请求之间的延迟 (秒)
+FETCH_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 32
+WRITE_BATCH_SIZE = 16
+FETCH_DELAY = 0.5
+
+# 时间槽状态；className为CHECKOUT_CLASS的时间槽已被预订
+SLOT_AVAILABLE = 'available'
+SLOT_UNAVAILABLE = 'unavailable'
+CHECKOUT_CLASS = 's-lc-eq-checkout'
+
+# grid API端点
+GRID_API_URL = "https://libcal.library.utoronto.ca/spaces/availability/grid"
+# 房间页面 (发现新房间时从这里读取名称和容量)
+SPACE_PAGE_URL = "https://libcal.library.utoronto.ca/space/{space_id}"
+
+def build_grid_request(space_id, gid, start_date, end_date, page_index=0):
+    """构建grid API请求的 (payload, headers)"""
     # 构建payload，使用传入的gid
     payload = {
         'lid': '3446',      # Library ID
@@ -118,7 +116,7 @@ def fetch_room_availability_api_raw(space_id, gid, start_date=None, end_date=Non
         'zone': '0',
         'start': start_date,
         'end': end_date,
-        'pageIndex': '0',
+        'pageIndex': str(page_index),
         'pageSize': '18'
     }
     
@@ -129,14 +127,31 @@ def fetch_room_availability_api_raw(space_id, gid, start_date=None, end_date=Non
         'Referer': f'https://libcal.library.utoronto.ca/space/{space_id}',
         'Origin': 'https://libcal.library.utoronto.ca'
     }
+    return payload, headers
+
+def fetch_room_availability_api_raw(space_id, gid, start_date=None, end_date=None, page_index=0):
+    """通过API获取指定房间的原始JSON数据"""
+    
+    # 如果没有指定日期，默认查询今天和明天
+    if not start_date:
+        start_date = datetime.now().strftime('%Y-%m-%d')
+    if not end_date:
+        end_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    
+    print(f"正在获取房间 {space_id} (gid:{gid}) 从 {start_date} 到 {end_date} 的原始数据...")
+    
+    payload, headers = build_grid_request(space_id, gid, start_date, end_date, page_index)
+    
+    # requests只在真正发请求时才导入，避免拖慢app.py的启动
+    import requests
     
     try:
         # 发送POST请求
-        response = requests.post(api_url, data=payload, headers=headers)
+        response = requests.post(GRID_API_URL, data=payload, headers=headers)
         response.raise_for_status()
         
         # 解析JSON响应
-        data = response.json()
+        data = json_loads(response.content)
         return data
         
     except requests.RequestException as e:
@@ -149,32 +164,112 @@ def fetch_room_availability_api_raw(space_id, gid, start_date=None, end_date=Non
         print(f"Other error: {e}")
         return None
 
-def process_slots_to_availability(slots):
-    """将slots数组处理成可用/不可用时间槽格式，使用className判断"""
-    available_slots = []
-    unavailable_slots = []
-    
-    for slot in slots:
-        slot_info = {
-            'start': slot['start'],
-            'end': slot['end'],
-            'item_id': slot['itemId'],
-            'checksum': slot.get('checksum', '')
-        }
-        
-        # 根据className判断是否可用
-        # 没有className或className不是's-lc-eq-checkout'的时间槽是可用的
-        if 'className' not in slot or slot['className'] != 's-lc-eq-checkout':
-            slot_info['status'] = 'available'
-            available_slots.append(slot_info)
-        else:
-            slot_info['status'] = 'unavailable'
-            unavailable_slots.append(slot_info)
+def split_date_range(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """把 [start_date, end_date) 切成不超过chunk_days天的块，返回 [(块开始, 块结束)]"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    if end <= start:
+        return [(start_date, end_date)]
+    chunks = []
+    while start < end:
+        chunk_end = min(start + timedelta(days=chunk_days), end)
+        chunks.append((start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d')))
+        start = chunk_end
+    return chunks
+
+def fetch_chunks_raw(space_id, gid, start_date, end_date, chunk_days=CHUNK_DAYS, max_workers=CHUNK_WORKERS, retries=CHUNK_RETRIES, chunks=None):
+    """按日期分块并行抓取原始时间槽，只重试失败的块；返回 ({chunk: raw_slots}, chunks)
+    
+    chunks不为None时只抓取给定的日期块 (续抓时跳过已完成的块)
+    """
+    if chunks is None:
+        chunks = split_date_range(start_date, end_date, chunk_days)
+    results = {}
+    pending = chunks
+    for attempt in range(retries + 1):
+        if attempt:
+            print(f"  重试房间 {space_id} 的 {len(pending)} 个失败日期块 (第{attempt}次)")
+            time.sleep(attempt)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            responses = executor.map(lambda chunk: fetch_room_availability_api_raw(space_id, gid, chunk[0], chunk[1]), pending)
+            for chunk, data in zip(pending, responses):
+                if data and 'slots' in data:
+                    results[chunk] = data['slots']
+        pending = [chunk for chunk in pending if chunk not in results]
+        if not pending:
+            break
+    return results, chunks
+
+def merge_chunk_slots(results, chunks):
+    """解析并合并各日期块的原始时间槽
+    
+    返回 (slots, windows)：windows是slots可以覆盖的时间窗口列表，全部失败时为空。
+    所有块都成功且首尾相连时返回一个窗口 (末尾延伸到API返回的最后一天)；否则只返回
+    成功块各自的窗口和其中的时间槽，失败块的旧数据不会被替换
+    """
+    # 相邻的块可能在边界日期上重复返回，按 (itemId, start) 去重
+    seen = set()
+    slots = []
+    for chunk in chunks:
+        for slot in parse_slots(results.get(chunk, ())):
+            key = (slot[3], slot[0])
+            if key not in seen:
+                seen.add(key)
+                slots.append(slot)
     
+    contiguous = all(prev[1] == chunk[0] for prev, chunk in zip(chunks, chunks[1:]))
+    if len(results) == len(chunks) and contiguous:
+        return slots, [get_refresh_window(chunks[0][0], chunks[-1][1], slots)]
+    windows = [chunk for chunk in chunks if chunk in results]
+    return [slot for slot in slots if any(start <= slot[0] < end for start, end in windows)], windows
+
+def fetch_availability_chunked(space_id, gid, start_date, end_date, chunk_days=CHUNK_DAYS, max_workers=CHUNK_WORKERS, retries=CHUNK_RETRIES):
+    """按日期分块并行抓取并合并结果，返回 (slots, windows)，见merge_chunk_slots"""
+    results, chunks = fetch_chunks_raw(space_id, gid, start_date, end_date, chunk_days, max_workers, retries)
+    return merge_chunk_slots(results, chunks)
+
+def save_availability_in_windows(space_id, gid, slots, windows, query_date, db_name, version):
+    """按窗口分别替换房间的时间槽 (slots为解析后的元组)"""
+    if len(windows) == 1:
+        save_availability_to_sqlite(space_id, gid, slots, query_date, db_name, version, windows[0])
+        return
+    for window in windows:
+        window_slots = [slot for slot in slots if window[0] <= slot[0] < window[1]]
+        save_availability_to_sqlite(space_id, gid, window_slots, query_date, db_name, version, window)
+
+def parse_slot(slot):
+    """把API返回的一个slot字典解析成 (start, end, status, item_id, checksum) 元组
+    
+    元组字段顺序与time_slots表的插入列一致；没有className或className不是
+    's-lc-eq-checkout'的时间槽是可用的
+    """
+    return (slot['start'], slot['end'], SLOT_UNAVAILABLE if slot.get('className') == CHECKOUT_CLASS else SLOT_AVAILABLE,
+            slot['itemId'], slot.get('checksum', ''))
+
+def parse_slots(raw_slots):
+    """用parse_slot解析API返回的slot列表，保持原顺序"""
+    return [parse_slot(slot) for slot in raw_slots]
+
+def parse_slots_by_item(raw_slots, date=None):
+    """用parse_slot解析时间槽并按itemId分组；指定date时只保留当天的时间槽"""
+    slots_by_item = {}
+    for slot in raw_slots:
+        if date is not None and not slot['start'].startswith(date):
+            continue
+        parsed = parse_slot(slot)
+        slots_by_item.setdefault(parsed[3], []).append(parsed)
+    return slots_by_item
+
+def count_available(slots):
+    return sum(1 for slot in slots if slot[2] == SLOT_AVAILABLE)
+
+def process_slots_to_availability(slots):
+    """将slots数组处理成可用/不可用时间槽格式 (解析后的元组)，用于展示和导出"""
+    parsed = parse_slots(slots)
     return {
-        'available': available_slots,
-        'unavailable': unavailable_slots,
-        'total_slots': len(available_slots) + len(unavailable_slots)
+        'available': [slot for slot in parsed if slot[2] == SLOT_AVAILABLE],
+        'unavailable': [slot for slot in parsed if slot[2] == SLOT_UNAVAILABLE],
+        'total_slots': len(parsed)
     }
 
 def fetch_room_availability_api(space_id, gid, start_date=None, end_date=None):
@@ -187,68 +282,21 @@ def fetch_room_availability_api(space_id, gid, start_date=None, end_date=None):
         end_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
     
     print(f"getting availability for room {space_id} (gid:{gid}) from {start_date} to {end_date}...")
-    # API端点
-    api_url = "https://libcal.library.utoronto.ca/spaces/availability/grid"
-    
-    # 构建payload，使用传入的gid
-    payload = {
-        'lid': '3446',      # Library ID
-        'gid': str(gid),    # 使用从CSV读取的gid
-        'eid': str(space_id),  # Equipment/Space ID
-        'seat': '0',
-        'seatId': '0', 
-        'zone': '0',
-        'start': start_date,
-        'end': end_date,
-        'pageIndex': '0',
-        'pageSize': '18'
-    }
+    payload, headers = build_grid_request(space_id, gid, start_date, end_date)
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36',
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'X-Requested-With': 'XMLHttpRequest',
-        'Referer': f'https://libcal.library.utoronto.ca/space/{space_id}',
-        'Origin': 'https://libcal.library.utoronto.ca'
-    }
+    # requests只在真正发请求时才导入，避免拖慢app.py的启动
+    import requests
     
     try:
         # 发送POST请求
-        response = requests.post(api_url, data=payload, headers=headers)
+        response = requests.post(GRID_API_URL, data=payload, headers=headers)
         response.raise_for_status()
         
         # 解析JSON响应
-        data = response.json()
-        
-        # 提取时间槽信息
-        available_slots = []
-        unavailable_slots = []
-        
-        if 'slots' in data:
-            for slot in data['slots']:
-                slot_info = {
-                    'start': slot['start'],
-                    'end': slot['end'],
-                    'item_id': slot['itemId'],
-                    'checksum': slot['checksum']
-                }
-                
-                # 根据className判断是否可用
-                # 没有className或className不是's-lc-eq-checkout'的时间槽是可用的
-                if 'className' not in slot or slot['className'] != 's-lc-eq-checkout':
-                    slot_info['status'] = 'available'
-                    available_slots.append(slot_info)
-                else:
-                    slot_info['status'] = 'unavailable'
-                    unavailable_slots.append(slot_info)
-
-        print(f"found {len(available_slots)} available time slots, {len(unavailable_slots)} unavailable time slots")
-
-        return {
-            'available': available_slots,
-            'unavailable': unavailable_slots,
-            'total_slots': len(available_slots) + len(unavailable_slots)
-        }
+        data = json_loads(response.content)
+        availability = process_slots_to_availability(data.get('slots', ()))
+        print(f"found {len(availability['available'])} available time slots, {len(availability['unavailable'])} unavailable time slots")
+        return availability
         
     except requests.RequestException as e:
         print(f"API request error: {e}")
@@ -261,9 +309,10 @@ def fetch_room_availability_api(space_id, gid, start_date=None, end_date=None):
         return None
 
 def init_sqlite_database(db_name="uoft_study_rooms.db"):
-    """初始化SQLite数据库"""
+    """初始化SQLite数据库 (WAL模式：读者不会被写入和发布阻塞)"""
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode = WAL')
     
     # 创建房间表
     cursor.execute('''
@@ -305,80 +354,517 @@ def init_sqlite_database(db_name="uoft_study_rooms.db"):
         CREATE INDEX IF NOT EXISTS idx_status ON time_slots (status)
     ''')
     
+    # 变更日志：每次刷新中状态发生变化的时间槽 (new_status为NULL表示时间槽被移除)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slot_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version INTEGER,
+            space_id INTEGER,
+            gid INTEGER,
+            start_time TEXT,
+            end_time TEXT,
+            old_status TEXT,
+            new_status TEXT,
+            checksum TEXT,
+            query_date TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_slot_changes_version ON slot_changes (version)
+    ''')
+    
+    # 已发布的刷新版本
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_log (
+            version INTEGER PRIMARY KEY,
+            change_count INTEGER,
+            published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 每个 (房间, 日期) 的刷新统计，供refresh_scheduler.py按变化频率分配抓取预算
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_stats (
+            space_id INTEGER,
+            query_date TEXT,
+            last_refreshed REAL,
+            refresh_count INTEGER DEFAULT 0,
+            change_count INTEGER DEFAULT 0,
+            change_rate REAL,
+            PRIMARY KEY (space_id, query_date)
+        )
+    ''')
+    
+    # 批量抓取的断点记录：已写入工作数据库的 (房间, 日期块)，中断后重新运行时跳过
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_journal (
+            space_id INTEGER,
+            chunk_start TEXT,
+            chunk_end TEXT,
+            gid INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (space_id, chunk_start, chunk_end)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            start_date TEXT,
+            end_date TEXT,
+            base_version INTEGER,
+            version INTEGER,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
     conn.commit()
     conn.close()
     print(f"SQLite {db_name} init completed")
 
 def save_rooms_to_sqlite(csv_filename, db_name="uoft_study_rooms.db"):
-    """将房间信息从CSV导入到SQLite数据库"""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    
-    try:
-        with open(csv_filename, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            
+    """将房间信息从CSV导入到SQLite数据库 (持有发布锁，不会和数据库替换交错)"""
+    with publish_lock(db_name):
+        conn = sqlite3.connect(db_name)
+        cursor = conn.cursor()
+        
+        try:
+            catalog = get_room_catalog(csv_filename)
+        
             # 清空现有房间数据
             cursor.execute('DELETE FROM rooms')
-            
-            for row in reader:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO rooms 
-                    (space_id, room_name, capacity_found_at, gid, url)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    int(row['space_id']),
-                    row['room_name'],
-                    int(row['capacity_found_at']),
-                    int(row['gid']),
-                    row['url']
-                ))
-            
+        
+            cursor.executemany('''
+                INSERT OR REPLACE INTO rooms 
+                (space_id, room_name, capacity_found_at, gid, url)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [record.as_row() for record in catalog])
+        
             conn.commit()
-            
+        
             # 获取导入的房间数量
             cursor.execute('SELECT COUNT(*) FROM rooms')
             count = cursor.fetchone()[0]
             print(f"successfully imported {count} rooms into the database")
             
-    except FileNotFoundError:
-        print(f"can not find CSV file: {csv_filename}")
-    except Exception as e:
-        print(f"error occurred while importing room data: {e}")
+        except FileNotFoundError:
+            print(f"can not find CSV file: {csv_filename}")
+        except Exception as e:
+            print(f"error occurred while importing room data: {e}")
+        finally:
+            conn.close()
+
+def get_db_version(db_name="uoft_study_rooms.db"):
+    """读取数据库当前已发布的刷新版本号 (PRAGMA user_version)"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
     finally:
         conn.close()
 
-def save_availability_to_sqlite(space_id, gid, availability_data, query_date, db_name="uoft_study_rooms.db"):
-    """将可用时间保存到SQLite数据库"""
+def begin_refresh(db_name="uoft_study_rooms.db"):
+    """返回本次刷新写入变更日志时使用的版本号"""
+    return get_db_version(db_name) + 1
+
+def record_refresh(cursor, version):
+    """在当前事务中写入refresh_log、清理过期的变更日志并更新user_version，返回变化数量"""
+    cursor.execute('SELECT COUNT(*) FROM slot_changes WHERE version = ?', (version,))
+    change_count = cursor.fetchone()[0]
+    cursor.execute('INSERT OR REPLACE INTO refresh_log (version, change_count) VALUES (?, ?)', (version, change_count))
+    
+    # 只保留最近CHANGE_FEED_RETENTION个版本的变更
+    cursor.execute('DELETE FROM slot_changes WHERE version <= ?', (version - CHANGE_FEED_RETENTION,))
+    cursor.execute('DELETE FROM refresh_log WHERE version <= ?', (version - CHANGE_FEED_RETENTION,))
+    cursor.execute(f'PRAGMA user_version = {int(version)}')
+    return change_count
+
+def record_refresh_stats(cursor, version, slices, refreshed_at=None):
+    """在当前事务中把刚刷新过的 (space_id, query_date) 切片记入refresh_stats，供refresh_scheduler.py判断新旧
+    
+    变化数取本版本slot_changes中落在各切片里的变化；变化率留给调度器自己估计
+    """
+    refreshed_at = time.time() if refreshed_at is None else refreshed_at
+    changes = {
+        (space_id, day): count
+        for space_id, day, count in cursor.execute('''
+            SELECT space_id, substr(start_time, 1, 10), COUNT(*) FROM slot_changes WHERE version = ? GROUP BY 1, 2
+        ''', (version,)).fetchall()
+    }
+    cursor.executemany('''
+        INSERT INTO refresh_stats (space_id, query_date, last_refreshed, refresh_count, change_count)
+        VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (space_id, query_date) DO UPDATE SET
+            last_refreshed = excluded.last_refreshed,
+            refresh_count = refresh_count + 1,
+            change_count = change_count + excluded.change_count
+    ''', [(space_id, day, refreshed_at, changes.get((space_id, day), 0)) for space_id, day in slices])
+
+def crawl_journal_slices(cursor):
+    """crawl_journal中已写入的 (房间, 日期块) 展开成 (space_id, query_date) 切片"""
+    slices = set()
+    for space_id, chunk_start, chunk_end in cursor.execute('SELECT space_id, chunk_start, chunk_end FROM crawl_journal').fetchall():
+        day = datetime.strptime(chunk_start, '%Y-%m-%d')
+        end = max(datetime.strptime(chunk_end, '%Y-%m-%d'), day + timedelta(days=1))
+        while day < end:
+            slices.add((space_id, day.strftime('%Y-%m-%d')))
+            day += timedelta(days=1)
+    return slices
+
+def publish_refresh(version, db_name="uoft_study_rooms.db"):
+    """发布刷新版本：写入refresh_log，更新user_version，并清理过期的变更日志"""
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
     
     try:
-        # 删除该房间该日期的旧数据
-        cursor.execute('''
-            DELETE FROM time_slots 
-            WHERE space_id = ? AND query_date = ?
-        ''', (space_id, query_date))
+        change_count = record_refresh(cursor, version)
+        conn.commit()
+        print(f"Published refresh version {version} ({change_count} changed slots)")
+        return change_count
+    finally:
+        conn.close()
+
+def remove_database_file(db_name):
+    """删除数据库文件及其日志文件"""
+    for path in (db_name, f"{db_name}-journal", f"{db_name}-wal", f"{db_name}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def copy_database(source_db, target_db):
+    """用backup API复制数据库 (复制期间源数据库可以正常读取)"""
+    source = sqlite3.connect(source_db)
+    target = sqlite3.connect(target_db)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+@contextmanager
+def publish_lock(db_name="uoft_study_rooms.db"):
+    """数据库的发布锁 (db_name.lock)：同一时间只有一个进程/线程写入正式数据库或替换它"""
+    if fcntl is None:
+        with PUBLISH_THREAD_LOCK:
+            yield
+        return
+    with open(f"{db_name}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class CrawlInProgressError(RuntimeError):
+    """同一个数据库已经有批量抓取在运行"""
+
+@contextmanager
+def crawl_lock(db_name="uoft_study_rooms.db"):
+    """批量抓取锁 (db_name.crawl.lock)：从准备工作数据库到发布一直持有，同一时间只有一个抓取使用db_name.crawl
+    
+    已被占用时不等待，直接抛出CrawlInProgressError
+    """
+    if fcntl is None:
+        if not CRAWL_THREAD_LOCK.acquire(blocking=False):
+            raise CrawlInProgressError(f"Another crawl of {db_name} is already running")
+        try:
+            yield
+        finally:
+            CRAWL_THREAD_LOCK.release()
+        return
+    with open(f"{db_name}.crawl.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise CrawlInProgressError(f"Another crawl of {db_name} is already running") from None
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def rebase_workspace(conn, db_name, base_version, live_version, version):
+    """工作库从base_version复制出来之后，正式数据库又发布了 (base_version, live_version]：
+    这些版本变化过的时间槽改用正式数据库中的状态 (工作库对它们的变化作废)，房间以正式数据库为准，刷新统计取较新的一方，
+    再接上正式数据库的变更日志，工作库自己的变化顺延为live_version + 1。返回新版本号
+    
+    正式数据库的变更日志已经不完整时无法重放，抛出RuntimeError，工作库需要重新抓取
+    """
+    new_version = live_version + 1
+    conn.execute('ATTACH DATABASE ? AS live', (db_name,))
+    try:
+        logged = conn.execute('''
+            SELECT COUNT(*) FROM live.refresh_log WHERE version > ? AND version <= ?
+        ''', (base_version, live_version)).fetchone()[0]
+        if logged != live_version - base_version:
+            raise RuntimeError(
+                f"{db_name} published versions {base_version + 1}-{live_version} during the crawl and its change log "
+                f"no longer covers them; the crawl has to be run again"
+            )
         
-        # 插入新数据
-        for slot in availability_data['available'] + availability_data['unavailable']:
-            cursor.execute('''
-                INSERT INTO time_slots 
-                (space_id, gid, start_time, end_time, status, item_id, checksum, query_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                space_id,
-                gid,
-                slot['start'],
-                slot['end'],
-                slot['status'],
-                slot['item_id'],
-                slot['checksum'],
-                query_date
-            ))
+        # 工作库自己的变化先顺延，避免和正式数据库的版本号重复
+        conn.execute('UPDATE slot_changes SET version = ? WHERE version = ?', (new_version, version))
+        conn.execute('DELETE FROM refresh_log WHERE version = ?', (version,))
         
+        conn.execute('DROP TABLE IF EXISTS temp.rebased_slots')
+        conn.execute('''
+            CREATE TEMP TABLE rebased_slots AS
+            SELECT DISTINCT space_id, start_time FROM live.slot_changes WHERE version > ? AND version <= ?
+        ''', (base_version, live_version))
+        conn.execute('''
+            DELETE FROM main.slot_changes
+            WHERE version = ? AND (space_id, start_time) IN (SELECT space_id, start_time FROM temp.rebased_slots)
+        ''', (new_version,))
+        conn.execute('''
+            DELETE FROM main.time_slots
+            WHERE (space_id, start_time) IN (SELECT space_id, start_time FROM temp.rebased_slots)
+        ''')
+        conn.execute('''
+            INSERT INTO main.time_slots (space_id, gid, start_time, end_time, status, item_id, checksum, query_date, created_at)
+            SELECT space_id, gid, start_time, end_time, status, item_id, checksum, query_date, created_at
+            FROM live.time_slots
+            WHERE (space_id, start_time) IN (SELECT space_id, start_time FROM temp.rebased_slots)
+        ''')
+        conn.execute('INSERT OR REPLACE INTO main.rooms SELECT * FROM live.rooms')
+        # 刷新统计按切片取较晚的一次刷新 (工作库里已经记入了本次抓取的切片)
+        conn.execute('''
+            INSERT OR REPLACE INTO main.refresh_stats SELECT * FROM live.refresh_stats AS l
+            WHERE NOT EXISTS (
+                SELECT 1 FROM main.refresh_stats AS m
+                WHERE m.space_id = l.space_id AND m.query_date = l.query_date AND m.last_refreshed >= l.last_refreshed
+            )
+        ''')
+        
+        # 接上正式数据库的变更日志，读者可以从任何仍在日志中的版本增量追上
+        conn.execute('''
+            INSERT INTO main.slot_changes
+            (version, space_id, gid, start_time, end_time, old_status, new_status, checksum, query_date, created_at)
+            SELECT version, space_id, gid, start_time, end_time, old_status, new_status, checksum, query_date, created_at
+            FROM live.slot_changes WHERE version > ? AND version <= ? ORDER BY id
+        ''', (base_version, live_version))
+        conn.execute('''
+            INSERT OR REPLACE INTO main.refresh_log SELECT * FROM live.refresh_log WHERE version > ? AND version <= ?
+        ''', (base_version, live_version))
+        conn.execute('DROP TABLE temp.rebased_slots')
+        change_count = record_refresh(conn.cursor(), new_version)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE live')
+    print(f"Rebased work database onto version {live_version} ({change_count} changed slots kept)")
+    return new_version
+
+def swap_in_database(work_db, db_name, base_version):
+    """把写好的工作数据库在一个事务中整体复制进正式数据库 (调用方持有发布锁)，返回正式数据库的版本号
+    
+    工作库没有发布新版本时直接丢弃；基于base_version复制之后正式数据库又发布过新版本时，
+    先用rebase_workspace把这些版本接进工作库，已发布的数据不会被覆盖，读者看到的版本号和变更日志保持连续。
+    正式数据库是WAL模式，不能用rename替换 (会和读者打开的-wal/-shm文件错配)；
+    backup在一个写事务中完成，读事务中的读者继续看到旧版本，之后的读取看到完整的新版本
+    """
+    conn = sqlite3.connect(work_db)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        live_version = get_db_version(db_name)
+        if version == base_version:
+            conn.close()
+            remove_database_file(work_db)
+            return live_version
+        if live_version > base_version:
+            version = rebase_workspace(conn, db_name, base_version, live_version, version)
+        live = sqlite3.connect(db_name)
+        try:
+            conn.backup(live)
+        finally:
+            live.close()
+    finally:
+        conn.close()
+    remove_database_file(work_db)
+    return version
+
+@contextmanager
+def shadow_database(db_name="uoft_study_rooms.db"):
+    """在影子数据库 (db_name.shadow) 中完成一次刷新，退出时用swap_in_database发布到正式数据库
+    
+    发布是在一个写事务中用backup API把影子库复制进正式数据库 (WAL模式)：读事务中的读者继续看到旧版本，
+    之后的读取看到完整的新版本，不会看到写了一半的刷新。出错时丢弃影子库，正式数据库保持不变
+    """
+    shadow_db = f"{db_name}.shadow"
+    with publish_lock(db_name):
+        remove_database_file(shadow_db)
+        copy_database(db_name, shadow_db)
+        base_version = get_db_version(shadow_db)
+        try:
+            yield shadow_db
+        except BaseException:
+            remove_database_file(shadow_db)
+            raise
+        swap_in_database(shadow_db, db_name, base_version)
+
+def change_log_covers(db_name, base_version):
+    """正式数据库的refresh_log是否完整记录了base_version之后发布的每个版本 (rebase_workspace需要重放它们)"""
+    conn = sqlite3.connect(db_name)
+    try:
+        live_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        logged = conn.execute('''
+            SELECT COUNT(*) FROM refresh_log WHERE version > ? AND version <= ?
+        ''', (base_version, live_version)).fetchone()[0]
+        return live_version >= base_version and logged == live_version - base_version
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+def open_crawl_workspace(db_name, start_date, end_date):
+    """准备批量抓取的工作数据库 (db_name.crawl)，返回 (work_db, version, done)；调用方从这里到发布一直持有crawl_lock
+    
+    工作库是同一日期范围的未完成抓取时直接续抓，done为crawl_journal中已完成的 {space_id: {chunk}}；
+    期间正式数据库发布过的新版本由swap_in_database中的rebase_workspace接上，只有变更日志已经
+    不完整时才丢弃工作库。否则用backup API复制正式数据库重新开始，base_version取复制出来的库的版本号
+    """
+    work_db = f"{db_name}.crawl"
+    
+    if os.path.exists(work_db):
+        conn = sqlite3.connect(work_db)
+        try:
+            state = conn.execute('SELECT start_date, end_date, base_version, version FROM crawl_state').fetchone()
+            if state and state[:2] == (start_date, end_date) and change_log_covers(db_name, state[2]):
+                done = {}
+                for space_id, chunk_start, chunk_end in conn.execute('SELECT space_id, chunk_start, chunk_end FROM crawl_journal'):
+                    done.setdefault(space_id, set()).add((chunk_start, chunk_end))
+                print(f"Resuming interrupted crawl: {sum(map(len, done.values()))} room/date chunks already done")
+                return work_db, state[3], done
+        except sqlite3.DatabaseError:
+            pass
+        finally:
+            conn.close()
+        print("Discarding stale crawl workspace")
+        remove_database_file(work_db)
+    
+    copy_database(db_name, work_db)
+    base_version = get_db_version(work_db)
+    version = base_version + 1
+    conn = sqlite3.connect(work_db)
+    try:
+        conn.execute('DELETE FROM crawl_journal')
+        conn.execute('DELETE FROM crawl_state')
+        conn.execute('''
+            INSERT INTO crawl_state (id, start_date, end_date, base_version, version) VALUES (1, ?, ?, ?, ?)
+        ''', (start_date, end_date, base_version, version))
+        conn.commit()
+    finally:
+        conn.close()
+    return work_db, version, {}
+
+def swap_in_crawl_workspace(work_db, db_name):
+    """把抓取完成的工作数据库整体发布为正式数据库，读者只会看到完整的旧库或新库"""
+    conn = sqlite3.connect(work_db)
+    try:
+        base_version, version = conn.execute('SELECT base_version, version FROM crawl_state').fetchone()
+        # 抓取过的切片记入refresh_stats，增量调度器不会把它们当成从未刷新过
+        cursor = conn.cursor()
+        record_refresh_stats(cursor, version, crawl_journal_slices(cursor))
         conn.commit()
-        print(f"房间 {space_id} 的 {len(availability_data['available']) + len(availability_data['unavailable'])} 个时间槽已保存到数据库")
+    finally:
+        conn.close()
+    with publish_lock(db_name):
+        version = swap_in_database(work_db, db_name, base_version)
+    print(f"Swapped crawl workspace into {db_name} (version {version})")
+    return version
+
+def get_refresh_window(start_date, end_date, slots):
+    """计算本次抓取覆盖的时间窗口 [start, end)，用于替换旧的时间槽"""
+    window_end = datetime.strptime(end_date, '%Y-%m-%d')
+    if slots:
+        last_day = datetime.strptime(max(slot[0] for slot in slots)[:10], '%Y-%m-%d')
+        window_end = max(window_end, last_day + timedelta(days=1))
+    window_end = max(window_end, datetime.strptime(start_date, '%Y-%m-%d') + timedelta(days=1))
+    return start_date, window_end.strftime('%Y-%m-%d')
+
+def replace_slots_with_changes(cursor, space_id, gid, slots, window, query_date, version):
+    """替换房间在时间窗口内的时间槽，并把状态变化写入变更日志，返回变化数量
+    
+    slots为parse_slots解析出的元组；query_date为None时使用每个时间槽自己的日期
+    """
+    window_start, window_end = window
+    cursor.execute('''
+        SELECT start_time, end_time, status, checksum FROM time_slots
+        WHERE space_id = ? AND start_time >= ? AND start_time < ?
+    ''', (space_id, window_start, window_end))
+    old_slots = {row[0]: row for row in cursor.fetchall()}
+    
+    changes = []
+    rewrite = False
+    for start_time, end_time, status, item_id, checksum in slots:
+        previous = old_slots.pop(start_time, None)
+        if previous is None or previous[2] != status:
+            changes.append((
+                version, space_id, gid, start_time, end_time,
+                previous[2] if previous else None, status, checksum, start_time[:10]
+            ))
+        elif previous[3] != checksum:
+            rewrite = True
+    for start_time, end_time, status, checksum in old_slots.values():
+        changes.append((version, space_id, gid, start_time, end_time, status, None, checksum, start_time[:10]))
+    
+    # 数据完全没有变化时跳过重写
+    if not changes and not rewrite:
+        return 0
+    
+    cursor.execute('''
+        DELETE FROM time_slots
+        WHERE space_id = ? AND start_time >= ? AND start_time < ?
+    ''', (space_id, window_start, window_end))
+    cursor.executemany('''
+        INSERT INTO time_slots 
+        (space_id, gid, start_time, end_time, status, item_id, checksum, query_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(space_id, gid, *slot, query_date or slot[0][:10]) for slot in slots])
+    cursor.executemany('''
+        INSERT INTO slot_changes
+        (version, space_id, gid, start_time, end_time, old_status, new_status, checksum, query_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', changes)
+    return len(changes)
+
+def prune_slots_before(start_date, version, db_name="uoft_study_rooms.db"):
+    """删除查询窗口之前的过期时间槽，并记录到变更日志"""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            INSERT INTO slot_changes
+            (version, space_id, gid, start_time, end_time, old_status, new_status, checksum, query_date)
+            SELECT ?, space_id, gid, start_time, end_time, status, NULL, checksum, substr(start_time, 1, 10)
+            FROM time_slots WHERE start_time < ?
+        ''', (version, start_date))
+        cursor.execute('DELETE FROM time_slots WHERE start_time < ?', (start_date,))
+        conn.commit()
+        if cursor.rowcount > 0:
+            print(f"Pruned {cursor.rowcount} time slots before {start_date}")
+    finally:
+        conn.close()
+
+def save_availability_to_sqlite(space_id, gid, slots, query_date, db_name="uoft_study_rooms.db", version=None, window=None):
+    """将时间槽 (parse_slots解析出的元组) 保存到SQLite数据库，只记录状态发生变化的时间槽"""
+    if window is None:
+        window = get_refresh_window(query_date, query_date, slots)
+    
+    # 单独调用时在影子数据库中写入并自行发布一个新版本
+    if version is None:
+        with shadow_database(db_name) as shadow_db:
+            version = begin_refresh(shadow_db)
+            save_availability_to_sqlite(space_id, gid, slots, query_date, shadow_db, version, window)
+            publish_refresh(version, shadow_db)
+        return
+    
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    
+    try:
+        change_count = replace_slots_with_changes(cursor, space_id, gid, slots, window, query_date, version)
+        conn.commit()
+        print(f"房间 {space_id} 的 {len(slots)} 个时间槽已保存到数据库 ({change_count} 个变化)")
         
     except Exception as e:
         print(f"保存时间槽数据时发生错误: {e}")
@@ -386,20 +872,15 @@ def save_availability_to_sqlite(space_id, gid, availability_data, query_date, db
         conn.close()
 
 def get_available_rooms_from_sqlite(db_name="uoft_study_rooms.db"):
-    """从SQLite数据库中读取所有房间"""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    
+    """从SQLite数据库中读取所有房间 (共享只读连接池)"""
     try:
-        cursor.execute('SELECT space_id, gid, room_name FROM rooms ORDER BY space_id')
-        rooms = cursor.fetchall()
+        with get_read_pool(db_name).connection() as conn:
+            rooms = conn.execute('SELECT space_id, gid, room_name FROM rooms ORDER BY space_id').fetchall()
         print(f"从数据库中读取到 {len(rooms)} 个房间")
         return rooms
     except Exception as e:
         print(f"读取房间数据时发生错误: {e}")
         return []
-    finally:
-        conn.close()
 
 def check_database_stats(db_name="uoft_study_rooms.db"):
     """检查数据库中的数据统计"""
@@ -540,26 +1021,15 @@ def save_availability_to_csv(space_id, availability_data, filename=None):
         
         writer.writeheader()
         
-        # 写入可用时间槽
-        for slot in availability_data['available']:
-            writer.writerow({
-                'space_id': space_id,
-                'start_time': slot['start'],
-                'end_time': slot['end'],
-                'status': slot['status'],
-                'item_id': slot['item_id'],
-                'checksum': slot['checksum']
-            })
-        
-        # 写入不可用时间槽
-        for slot in availability_data['unavailable']:
+        # 先写入可用时间槽，再写入不可用时间槽
+        for start_time, end_time, status, item_id, checksum in availability_data['available'] + availability_data['unavailable']:
             writer.writerow({
                 'space_id': space_id,
-                'start_time': slot['start'],
-                'end_time': slot['end'],
-                'status': slot['status'],
-                'item_id': slot['item_id'],
-                'checksum': slot['checksum']
+                'start_time': start_time,
+                'end_time': end_time,
+                'status': status,
+                'item_id': item_id,
+                'checksum': checksum
             })
     
     print(f"可用时间数据已保存到 {filename}")
@@ -579,8 +1049,193 @@ def get_available_rooms_from_csv(csv_filename="uoft_study_rooms_20250916_145956.
         print(f"找不到文件 {csv_filename}")
         return []
 
-def check_all_rooms_availability_sqlite(start_date=None, end_date=None, db_name=None):
-    """检查所有房间的可用时间并存储到SQLite数据库 - 优化版本，避免重复抓取"""
+class StageStats:
+    """流水线单个阶段的统计：处理数量、忙碌时间、输入队列深度、下游队列满时被阻塞的时间"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.samples = 0
+        self.lock = threading.Lock()
+    
+    def take(self, source):
+        """从输入队列取一项，同时采样队列深度"""
+        item = source.get()
+        depth = source.qsize()
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_total += depth
+            self.samples += 1
+        return item
+    
+    def give(self, target, item):
+        """放入下游有界队列，队列满时阻塞 (反压) 并记录阻塞时间"""
+        started = time.perf_counter()
+        target.put(item)
+        with self.lock:
+            self.blocked += time.perf_counter() - started
+    
+    def record(self, busy, items=1):
+        with self.lock:
+            self.busy += busy
+            self.items += items
+    
+    def summary(self):
+        return {
+            'items': self.items,
+            'busy': self.busy,
+            'blocked': self.blocked,
+            'max_depth': self.max_depth,
+            'avg_depth': self.depth_total / self.samples if self.samples else 0.0,
+        }
+
+def drain_queue(source):
+    """取走队列中现有的所有项 (不阻塞)"""
+    while True:
+        try:
+            source.get_nowait()
+        except queue.Empty:
+            return
+
+def interleave_by_gid(rooms):
+    """按gid轮流排列房间，让同时进行的请求尽量落在不同的gid上 (同一gid的响应会顺带返回相邻房间)"""
+    by_gid = {}
+    for room in rooms:
+        by_gid.setdefault(room[1], []).append(room)
+    return [room for group in zip_longest(*by_gid.values()) for room in group if room is not None]
+
+def fetch_stage(rooms, parse_queue, covered, chunks, start_date, end_date, stats):
+    """抓取阶段 (多个线程)：从rooms队列取房间，抓取还没有完成的日期块的原始数据交给解析阶段"""
+    while True:
+        room = stats.take(rooms)
+        if room is None:
+            return
+        space_id, gid, room_name = room
+        pending = [chunk for chunk in chunks if chunk not in covered.get(space_id, ())]
+        if not pending:
+            print(f"跳过房间 {space_id} - {room_name} (已在之前的API调用中处理)")
+            continue
+        started = time.perf_counter()
+        try:
+            results, _ = fetch_chunks_raw(space_id, gid, start_date, end_date, chunks=pending)
+        except Exception as e:
+            print(f"  抓取房间 {space_id} 时发生错误: {e}")
+            results = {}
+        stats.record(time.perf_counter() - started)
+        stats.give(parse_queue, (space_id, gid, results, pending))
+        if results:
+            # 添加延迟避免请求过于频繁
+            time.sleep(FETCH_DELAY)
+
+def parse_stage(parse_queue, write_queue, covered, catalog, stats, counts):
+    """解析阶段 (单线程)：合并解析日期块，按房间拆分后交给写入阶段；已写入的 (房间, 日期块) 不再重复写入"""
+    while True:
+        item = stats.take(parse_queue)
+        if item is None:
+            stats.give(write_queue, None)
+            return
+        space_id, gid, results, chunks = item
+        started = time.perf_counter()
+        units = []
+        try:
+            slots, windows = merge_chunk_slots(results, chunks) if results else ([], [])
+            fetched = [chunk for chunk in chunks if chunk in results]
+            if not windows:
+                print(f"  获取房间 {space_id} 数据失败")
+                counts['error'] += 1
+            
+            slots_by_item = {}
+            for slot in slots:
+                slots_by_item.setdefault(slot[3], []).append(slot)
+            if fetched:
+                # 目标房间的响应里没有它自己的时间槽也要写入：替换掉旧数据并记录到断点
+                slots_by_item.setdefault(space_id, [])
+            for item_id, item_slots in slots_by_item.items():
+                item_done = covered.setdefault(item_id, set())
+                new_chunks = [chunk for chunk in fetched if chunk not in item_done]
+                if not new_chunks:
+                    continue
+                item_windows = windows
+                if len(new_chunks) < len(fetched):
+                    # 部分日期块已由之前的响应写入，只替换剩下的块
+                    item_windows = new_chunks
+                    item_slots = [slot for slot in item_slots if any(start <= slot[0] < end for start, end in new_chunks)]
+                first_seen = not item_done
+                item_done.update(new_chunks)
+                available = count_available(item_slots)
+                if item_id == space_id:
+                    counts['success'] += 1
+                    units.append((item_id, gid, item_slots, item_windows, new_chunks))
+                    print(f"  目标房间 {item_id}: {available} 可用 + {len(item_slots) - available} 不可用")
+                elif first_seen:
+                    record = catalog.get(item_id)
+                    counts['bonus'] += 1
+                    units.append((item_id, record.gid if record else 0, item_slots, item_windows, new_chunks))
+                    bonus_name = record.room_name if record else f'未知房间{item_id}'
+                    print(f"  额外获得房间 {item_id} - {bonus_name}: {available} 可用 + {len(item_slots) - available} 不可用")
+        except Exception as e:
+            print(f"  处理房间 {space_id} 时发生错误: {e}")
+            counts['error'] += 1
+        stats.record(time.perf_counter() - started)
+        for unit in units:
+            stats.give(write_queue, unit)
+
+def write_stage(write_queue, db_name, query_date, version, known_rooms, catalog, stats):
+    """写入阶段 (唯一的数据库连接)：队列中已有的结果和对应的断点记录合并成一个事务提交，最后记录刷新版本"""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    
+    try:
+        done = False
+        while not done:
+            batch = [stats.take(write_queue)]
+            while not write_queue.empty() and len(batch) < WRITE_BATCH_SIZE:
+                batch.append(write_queue.get_nowait())
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            started = time.perf_counter()
+            for space_id, gid, slots, windows, chunks in batch:
+                # 不在数据库中的房间 (顺带返回的房间) 补全元数据
+                record = catalog.get(space_id)
+                if space_id not in known_rooms and record:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', record.as_row())
+                    known_rooms.add(space_id)
+                for window in windows:
+                    window_slots = slots if len(windows) == 1 else [slot for slot in slots if window[0] <= slot[0] < window[1]]
+                    replace_slots_with_changes(cursor, space_id, gid, window_slots, window, query_date, version)
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO crawl_journal (space_id, chunk_start, chunk_end, gid) VALUES (?, ?, ?, ?)
+                ''', [(space_id, *chunk, gid) for chunk in chunks])
+            conn.commit()
+            stats.record(time.perf_counter() - started, len(batch))
+        
+        change_count = record_refresh(cursor, version)
+        conn.commit()
+        print(f"Recorded refresh version {version} ({change_count} changed slots)")
+    finally:
+        conn.close()
+
+def print_pipeline_stats(stages, elapsed):
+    print(f"\n流水线统计 (总耗时 {elapsed:.1f}s):")
+    print(f"  {'阶段':<8}{'数量':>8}{'忙碌(s)':>10}{'阻塞(s)':>10}{'最大队列':>10}{'平均队列':>10}")
+    for stage in stages:
+        summary = stage.summary()
+        print(f"  {stage.name:<8}{summary['items']:>8}{summary['busy']:>10.2f}{summary['blocked']:>10.2f}"
+              f"{summary['max_depth']:>10}{summary['avg_depth']:>10.1f}")
+
+def check_all_rooms_availability_sqlite(start_date=None, end_date=None, db_name=None, backend="threads"):
+    """检查所有房间的可用时间并存储到SQLite数据库 - 优化版本，避免重复抓取
+    
+    backend为"async"时使用async_crawler.py中基于asyncio的抓取引擎
+    """
     
     if not db_name:
         db_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uoft_study_rooms.db")
@@ -591,13 +1246,9 @@ def check_all_rooms_availability_sqlite(start_date=None, end_date=None, db_name=
     if not end_date:
         end_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
 
-    # 删除整个数据库文件，保证全新开始
+    # 保留已有数据，只替换本次抓取的时间窗口，以便生成变更日志
     try:
-        if os.path.exists(db_name):
-            os.remove(db_name)
-            print(f'Deleted existing database: {db_name}')
-        
-        # 重新初始化数据库和导入房间数据
+        # 初始化数据库(如不存在)和导入房间数据
         init_sqlite_database(db_name)
         
         # 重新导入房间数据
@@ -611,6 +1262,10 @@ def check_all_rooms_availability_sqlite(start_date=None, end_date=None, db_name=
     except Exception as e:
         print(f'Error resetting database: {e}')
 
+    if backend == "async":
+        from async_crawler import crawl_all_rooms
+        return crawl_all_rooms(start_date, end_date, db_name)
+
     query_date = start_date
 
     # 从数据库获取房间列表
@@ -620,110 +1275,288 @@ def check_all_rooms_availability_sqlite(start_date=None, end_date=None, db_name=
         print("没有找到房间列表，请先导入房间数据")
         return
     
-    # 读取CSV房间元数据，用于补全额外抓取的房间信息
-    csv_file = get_latest_csv_file()
-    room_meta = {}
-    if csv_file:
-        with open(csv_file, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                room_meta[int(row['space_id'])] = row
-    
-    # 记录已处理的房间，避免重复
-    processed_rooms = set()
-    success_count = 0
-    error_count = 0
-    bonus_rooms_count = 0  # 额外获得的房间数量
-    
-    for i, (space_id, gid, room_name) in enumerate(rooms):
-        if space_id in processed_rooms:
-            print(f"跳过房间 {space_id} - {room_name} (已在之前的API调用中处理)")
-            continue
-            
-        print(f"\n处理房间 {i+1}/{len(rooms)}: {space_id} - {room_name} (gid:{gid})")
+    # 在工作数据库中抓取，完成后发布到正式数据库；中断后重新运行时从断点继续。
+    # 抓取锁保证同一时间只有一个抓取使用工作数据库
+    with crawl_lock(db_name):
+        work_db, version, covered = open_crawl_workspace(db_name, start_date, end_date)
+        prune_slots_before(start_date, version, work_db)
+        chunks = split_date_range(start_date, end_date)
         
+        # 抓取、解析、写入分成三个阶段，之间用有界队列连接：网络请求和数据库提交可以同时进行，
+        # 写入跟不上时队列填满，上游自动阻塞
+        catalog = get_room_catalog()
+        known_rooms = {space_id for space_id, _, _ in rooms}
+        counts = {'success': 0, 'bonus': 0, 'error': 0}
+        fetch_stats, parse_stats, write_stats = StageStats('fetch'), StageStats('parse'), StageStats('write')
+        
+        room_queue = queue.Queue()
+        for room in interleave_by_gid(rooms):
+            room_queue.put(room)
+        for _ in range(FETCH_WORKERS):
+            room_queue.put(None)
+        parse_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        write_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        
+        started = time.perf_counter()
+        fetchers = [
+            threading.Thread(target=fetch_stage, args=(room_queue, parse_queue, covered, chunks, start_date, end_date, fetch_stats), daemon=True)
+            for _ in range(FETCH_WORKERS)
+        ]
+        parser = threading.Thread(
+            target=parse_stage, args=(parse_queue, write_queue, covered, catalog, parse_stats, counts), daemon=True
+        )
+        for thread in fetchers + [parser]:
+            thread.start()
+        
+        def close_parse_queue():
+            for thread in fetchers:
+                thread.join()
+            parse_queue.put(None)
+        
+        closer = threading.Thread(target=close_parse_queue, daemon=True)
+        closer.start()
         try:
-            # 调用API获取数据
-            response_data = fetch_room_availability_api_raw(space_id, gid, start_date, end_date)
-            
-            if response_data and 'slots' in response_data:
-                # 按itemId分组所有返回的slots
-                slots_by_item = {}
-                for slot in response_data['slots']:
-                    item_id = slot['itemId']
-                    slots_by_item.setdefault(item_id, []).append(slot)
-                
-                # 处理目标房间的数据
-                if space_id in slots_by_item:
-                    target_slots = slots_by_item[space_id]
-                    availability = process_slots_to_availability(target_slots)
-                    save_availability_to_sqlite(space_id, gid, availability, query_date, db_name)
-                    processed_rooms.add(space_id)
-                    success_count += 1
-                    print(f"  目标房间 {space_id}: {len(availability['available'])} 可用 + {len(availability['unavailable'])} 不可用")
-                
-                # 处理额外获取的房间数据
-                conn = sqlite3.connect(db_name)
-                cursor = conn.cursor()
-                
-                for item_id, slots in slots_by_item.items():
-                    if item_id != space_id and item_id not in processed_rooms:
-                        # 检查该房间是否已在数据库中
-                        cursor.execute('SELECT space_id FROM rooms WHERE space_id = ?', (item_id,))
-                        if not cursor.fetchone():
-                            # 从CSV获取元数据并插入
-                            meta = room_meta.get(item_id)
-                            if meta:
-                                cursor.execute('''
-                                    INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
-                                    VALUES (?, ?, ?, ?, ?)
-                                ''', (
-                                    int(meta['space_id']),
-                                    meta['room_name'],
-                                    int(meta['capacity_found_at']),
-                                    int(meta['gid']),
-                                    meta['url']
-                                ))
-                                conn.commit()
-                        
-                        # 处理时间槽数据
-                        availability = process_slots_to_availability(slots)
-                        bonus_gid = int(room_meta.get(item_id, {}).get('gid', 0))
-                        save_availability_to_sqlite(item_id, bonus_gid, availability, query_date, db_name)
-                        processed_rooms.add(item_id)
-                        bonus_rooms_count += 1
-                        
-                        bonus_name = room_meta.get(item_id, {}).get('room_name', f'未知房间{item_id}')
-                        print(f"  额外获得房间 {item_id} - {bonus_name}: {len(availability['available'])} 可用 + {len(availability['unavailable'])} 不可用")
-                
-                conn.close()
-                
-                # 添加延迟避免请求过于频繁
-                time.sleep(0.5)
-            else:
-                print(f"  获取房间 {space_id} 数据失败")
-                error_count += 1
-                
-        except Exception as e:
-            print(f"  处理房间 {space_id} 时发生错误: {e}")
-            error_count += 1
+            write_stage(write_queue, work_db, query_date, version, known_rooms, catalog, write_stats)
+        except BaseException:
+            # 写入失败：撤掉还没抓取的房间，并持续取走写入队列，直到阻塞在有界队列上的抓取和解析线程全部退出
+            drain_queue(room_queue)
+            for _ in range(FETCH_WORKERS):
+                room_queue.put(None)
+            while parser.is_alive():
+                drain_queue(write_queue)
+                parser.join(0.1)
+            closer.join()
+            raise
+        parser.join()
+        swap_in_crawl_workspace(work_db, db_name)
     
     print(f"\n批量处理完成:")
-    print(f"  目标成功: {success_count} 个房间")
-    print(f"  额外获得: {bonus_rooms_count} 个房间")
-    print(f"  失败: {error_count} 个房间")
-    print(f"  总计处理: {len(processed_rooms)} 个房间")
+    print(f"  目标成功: {counts['success']} 个房间")
+    print(f"  额外获得: {counts['bonus']} 个房间")
+    print(f"  失败: {counts['error']} 个房间")
+    print(f"  总计处理: {len(covered)} 个房间")
     print(f"  原计划: {len(rooms)} 个房间")
+    print_pipeline_stats((fetch_stats, parse_stats, write_stats), time.perf_counter() - started)
+
+def fetch_rooms_for_date(rooms, target_date, max_workers=8):
+    """并发抓取所有房间在target_date当天的时间槽，返回 ({space_id: slots}, 失败房间数)
+    
+    grid API一次会返回同一gid下的多个房间，已经被其他请求覆盖的房间不再单独请求
+    """
+    next_date = (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    slots_by_room = {}
+    failed = []
+    lock = threading.Lock()
+    
+    def fetch(room):
+        space_id, gid, room_name = room
+        with lock:
+            if space_id in slots_by_room:
+                return
+        data = fetch_room_availability_api_raw(space_id, gid, target_date, next_date)
+        if not data or 'slots' not in data:
+            with lock:
+                failed.append(space_id)
+            return
+        # 只保留目标日期的时间槽
+        fetched = parse_slots_by_item(data['slots'], target_date)
+        fetched.setdefault(space_id, [])
+        with lock:
+            for item_id, slots in fetched.items():
+                slots_by_room.setdefault(item_id, slots)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(fetch, interleave_by_gid(rooms)))
+    return slots_by_room, len([space_id for space_id in failed if space_id not in slots_by_room])
+
+def refresh_date(target_date, db_name=None, max_workers=8):
+    """只刷新某一天所有房间的时间槽，其他日期的数据保持不变；所有写入在一个事务中完成"""
+    if not db_name:
+        db_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uoft_study_rooms.db")
+    
+    init_sqlite_database(db_name)
+    rooms = get_available_rooms_from_sqlite(db_name)
+    if not rooms:
+        csv_file = get_latest_csv_file()
+        if csv_file:
+            save_rooms_to_sqlite(csv_file, db_name)
+            rooms = get_available_rooms_from_sqlite(db_name)
+    if not rooms:
+        print("没有找到房间列表，请先导入房间数据")
+        return None
+    
+    start = time.time()
+    slots_by_room, error_count = fetch_rooms_for_date(rooms, target_date, max_workers)
+    
+    catalog = get_room_catalog()
+    known_rooms = {space_id: gid for space_id, gid, _ in rooms}
+    window = get_refresh_window(target_date, target_date, [])
+    
+    # 在影子数据库中写入，发布时在一个事务中复制进正式数据库，读者不会看到写了一半的数据
+    with shadow_database(db_name) as shadow_db:
+        conn = sqlite3.connect(shadow_db)
+        cursor = conn.cursor()
+        try:
+            version = cursor.execute('PRAGMA user_version').fetchone()[0] + 1
+            for space_id, slots in slots_by_room.items():
+                record = catalog.get(space_id)
+                if space_id not in known_rooms and record:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', record.as_row())
+                gid = known_rooms.get(space_id) or (record.gid if record else 0)
+                replace_slots_with_changes(cursor, space_id, gid, slots, window, target_date, version)
+            record_refresh_stats(cursor, version, [(space_id, target_date) for space_id in slots_by_room])
+            change_count = record_refresh(cursor, version)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    print(f"Refreshed {target_date}: {len(slots_by_room)} rooms, {error_count} failed, "
+          f"{change_count} changed slots in {time.time() - start:.1f}s (version {version})")
+    return {'rooms': len(slots_by_room), 'failed': error_count, 'changes': change_count, 'version': version}
 
-def get_latest_csv_file():
-    """获取最新的房间CSV文件"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_files = [f for f in os.listdir(script_dir) if f.startswith('uoft_study_rooms') and f.endswith('.csv')]
-    if not csv_files:
+def export_rooms_to_csv(csv_filename, db_name="uoft_study_rooms.db"):
+    """把rooms表写回房间CSV (先写临时文件再替换，避免读到半个文件)"""
+    with get_read_pool(db_name).connection() as conn:
+        rows = conn.execute('SELECT space_id, room_name, capacity_found_at, gid, url FROM rooms ORDER BY gid, space_id').fetchall()
+    
+    temp_filename = csv_filename + '.tmp'
+    with open(temp_filename, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['space_id', 'room_name', 'capacity_found_at', 'gid', 'url'])
+        writer.writerows(rows)
+    os.replace(temp_filename, csv_filename)
+    print(f"Exported {len(rows)} rooms to {csv_filename}")
+
+def fetch_grid_item_ids(gid, eid=0, start_date=None, end_date=None, max_pages=10):
+    """分页请求某个gid的grid API，返回出现过的所有itemId；第一页失败时返回None"""
+    item_ids = set()
+    for page_index in range(max_pages):
+        data = fetch_room_availability_api_raw(eid, gid, start_date, end_date, page_index=page_index)
+        if not data or not data.get('slots'):
+            if page_index == 0:
+                return None
+            break
+        page_ids = {slot['itemId'] for slot in data['slots']}
+        # 没有新的itemId说明已经翻到最后一页
+        if page_ids <= item_ids:
+            break
+        item_ids |= page_ids
+    return item_ids
+
+def fetch_room_details(space_id):
+    """从房间页面读取 (房间名称, 容量)；请求失败或页面中找不到名称时返回None，容量找不到时为0"""
+    import requests
+    
+    try:
+        response = requests.get(SPACE_PAGE_URL.format(space_id=space_id), timeout=15, headers={
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36'
+        })
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Failed to fetch details of room {space_id}: {e}")
+        return None
+    
+    # 页面标题形如 "Group Study Room 2D - Robarts Library - LibCal - University of Toronto"
+    match = re.search(r'<title>\s*(.*?)\s*</title>', response.text, re.S | re.I)
+    if not match:
         return None
-    # 按文件名排序，最新的在最后
-    csv_files.sort()
-    return os.path.join(script_dir, csv_files[-1])
+    room_name = html.unescape(re.split(r'\s+[-|]\s+', match.group(1))[0]).strip()
+    if not room_name or 'libcal' in room_name.lower():
+        return None
+    capacity = re.search(r'Capacity\s*:?\s*(?:<[^>]*>\s*)*(\d+)', response.text, re.I)
+    return room_name, int(capacity.group(1)) if capacity else 0
+
+def discover_room_catalog(gids=None, db_name="uoft_study_rooms.db", csv_filename=None, max_workers=4):
+    """并行枚举每个gid在grid API中返回的itemId，与rooms表对比后增量更新房间目录
+    
+    目录中没有的新房间从房间页面读取名称和容量；读取失败的房间不写入rooms表和CSV，下次发现时重试
+    """
+    init_sqlite_database(db_name)
+    conn = sqlite3.connect(db_name)
+    try:
+        stored_rooms = dict(conn.execute('SELECT space_id, gid FROM rooms').fetchall())
+    finally:
+        conn.close()
+    
+    if gids is None:
+        gids = sorted(set(LIBRARY_GIDS) | set(stored_rooms.values()))
+    
+    # 每个gid用一个已知房间作为eid，未知gid用0
+    eid_by_gid = {}
+    for space_id, gid in stored_rooms.items():
+        eid_by_gid[gid] = min(space_id, eid_by_gid.get(gid, space_id))
+    
+    print(f"Discovering rooms for {len(gids)} gids with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(gids, executor.map(lambda gid: fetch_grid_item_ids(gid, eid_by_gid.get(gid, 0)), gids)))
+    
+    # 房间名称优先使用目录中已有的元数据，目录中没有的从房间页面读取
+    catalog = get_room_catalog()
+    new_ids = sorted({
+        item_id for item_ids in results.values() if item_ids
+        for item_id in item_ids if item_id not in stored_rooms and item_id not in catalog
+    })
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        details = dict(zip(new_ids, executor.map(fetch_room_details, new_ids)))
+    
+    added, moved, missing, failed, unresolved = [], [], [], [], []
+    new_records, gid_updates = [], []
+    for gid, item_ids in results.items():
+        if item_ids is None:
+            failed.append(gid)
+            continue
+        for item_id in sorted(item_ids):
+            if item_id not in stored_rooms:
+                known = catalog.get(item_id)
+                if known:
+                    room_name, capacity = known.room_name, known.capacity
+                elif details.get(item_id):
+                    room_name, capacity = details[item_id]
+                else:
+                    unresolved.append(item_id)
+                    continue
+                new_records.append(RoomRecord(item_id, room_name, capacity, gid, SPACE_PAGE_URL.format(space_id=item_id)))
+                stored_rooms[item_id] = gid
+                added.append(item_id)
+            elif stored_rooms[item_id] != gid:
+                gid_updates.append((gid, item_id))
+                stored_rooms[item_id] = gid
+                moved.append(item_id)
+        missing.extend(space_id for space_id, room_gid in stored_rooms.items() if room_gid == gid and space_id not in item_ids)
+    
+    # 目录有变化时在影子数据库中写入并发布一个新版本，读者的缓存随版本号失效
+    if added or moved:
+        with shadow_database(db_name) as shadow_db:
+            conn = sqlite3.connect(shadow_db)
+            cursor = conn.cursor()
+            try:
+                version = cursor.execute('PRAGMA user_version').fetchone()[0] + 1
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO rooms (space_id, room_name, capacity_found_at, gid, url)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [record.as_row() for record in new_records])
+                cursor.executemany('UPDATE rooms SET gid = ? WHERE space_id = ?', gid_updates)
+                record_refresh(cursor, version)
+                conn.commit()
+            finally:
+                conn.close()
+        print(f"Published room catalog changes as version {version}")
+        # 同时写回CSV，下次刷新导入房间时也能保留
+        export_rooms_to_csv(csv_filename or catalog.source or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uoft_study_rooms.csv'), db_name)
+    
+    print(f"\nCatalog discovery completed:")
+    print(f"  New rooms: {len(added)} {added[:10]}")
+    print(f"  Moved to another gid: {len(moved)}")
+    print(f"  Not returned by the API: {len(missing)}")
+    if unresolved:
+        print(f"  Skipped (name not found): {len(unresolved)} {unresolved[:10]}")
+    if failed:
+        print(f"  Failed gids: {failed}")
+    
+    return {'added': added, 'moved': moved, 'missing': missing, 'failed': failed, 'unresolved': unresolved}
 
 def main():
     print("UofT Study Room Availability Query System")
@@ -742,16 +1575,18 @@ def main():
         print("   Importing room data into the database...")
         save_rooms_to_sqlite(csv_file, db_name)
     else:
-        print("2. No room CSV file found. Please run test.py first to generate the room list.")
-        return
+        print("2. No room CSV file found. Discovering the room catalog from the API...")
+        discover_room_catalog(db_name=db_name)
     
     # Ask for user action
     print("\nPlease choose an action:")
     print("1. Test a single room")
     print("2. Batch fetch availability for all rooms within two weeks (API)")
-    print("3. Exit")
+    print("3. Discover new rooms and update the room catalog (API)")
+    print("4. Refresh a single date for all rooms (API)")
+    print("5. Exit")
 
-    choice = input("Enter your choice (1/2/3): ").strip()
+    choice = input("Enter your choice (1/2/3/4/5): ").strip()
 
     if choice == "1":
         # Test a single room
@@ -768,15 +1603,15 @@ def main():
             print(f"  Unavailable timeslots: {len(availability['unavailable'])}")
             
             print(f"\nAvailable timeslot details:")
-            for slot in availability['available'][:10]:  # show first 10 only
-                print(f"  {slot['start']} - {slot['end']}")
+            for start_time, end_time, *_ in availability['available'][:10]:  # show first 10 only
+                print(f"  {start_time} - {end_time}")
             
             if len(availability['available']) > 10:
                 print(f"  ... and {len(availability['available']) - 10} more available timeslots")
             
             # Save to database
             query_date = datetime.now().strftime('%Y-%m-%d')
-            save_availability_to_sqlite(space_id, gid, availability, query_date, db_name)
+            save_availability_to_sqlite(space_id, gid, availability['available'] + availability['unavailable'], query_date, db_name)
             
         else:
             print(f"Failed to fetch availability for room {space_id}.")
@@ -787,9 +1622,19 @@ def main():
         start_date = datetime.now().strftime('%Y-%m-%d')
         end_date = (datetime.now() + timedelta(weeks=2)).strftime('%Y-%m-%d')
         print(f"Query date range: {start_date} to {end_date}")
+        backend = "async" if input("Use the asyncio crawler? (y/N): ").strip().lower() == "y" else "threads"
         print("This may take a while. Please be patient...")
-        check_all_rooms_availability_sqlite(start_date, end_date, db_name)
+        try:
+            check_all_rooms_availability_sqlite(start_date, end_date, db_name, backend)
+        except CrawlInProgressError as e:
+            print(e)
     elif choice == "3":
+        print("\nDiscovering rooms for all known gids...")
+        discover_room_catalog(db_name=db_name)
+    elif choice == "4":
+        target_date = input("Enter date (YYYY-MM-DD, default tomorrow): ").strip() or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        refresh_date(target_date, db_name)
+    elif choice == "5":
         print("Exiting program.")
     else:
         print("Invalid choice.")
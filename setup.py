@@ -17,6 +17,16 @@ a = Analysis(
     datas=[
         ('app.py', '.'),
         ('script.py', '.'),
+        ('room_catalog.py', '.'),
+        ('room_search.py', '.'),
+        ('query_service.py', '.'),
+        ('api_server.py', '.'),
+        ('prewarm.py', '.'),
+        ('refresh_scheduler.py', '.'),
+        ('async_crawler.py', '.'),
+        ('db_pool.py', '.'),
+        ('ics_export.py', '.'),
+        ('slot_watcher.py', '.'),
         ('requirements.txt', '.'),
         ('README.md', '.'),
         ('uoft_study_rooms.csv', '.'),
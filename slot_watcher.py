@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+空出提醒：订阅 "某类房间/某个房间 在星期几或某天的某个时间段"，每次刷新发布后，
+把变更日志中变为可预约的时间槽和订阅匹配，匹配到的发送到通知文件或webhook。
+
+订阅按 (房间或gid, 星期几/日期) 分桶，桶内按开始时间排序，
+每个变化的时间槽只用二分查找检查和它时间重叠的订阅，不需要遍历所有订阅。
+
+添加订阅:  python slot_watcher.py add --gid 7708 --weekday thu --from 14:00 --to 16:00
+           python slot_watcher.py add --room "GSR 2D" --date 2025-10-02 --from 10:00 --to 12:00 --webhook http://...
+查看/删除:  python slot_watcher.py list / python slot_watcher.py remove <id>
+开始监视:  python slot_watcher.py run [--interval 30] [--once]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from db_pool import get_read_pool
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'uoft_study_rooms.db')
+DEFAULT_WATCH_DIR = os.path.join(BASE_DIR, '.cache', 'watch')
+SUBSCRIPTIONS_NAME = 'subscriptions.json'
+STATE_NAME = 'state.json'
+NOTIFICATIONS_NAME = 'notifications.jsonl'
+
+# 多久检查一次数据库版本 (秒)
+DEFAULT_INTERVAL = 30
+WEBHOOK_TIMEOUT = 5
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# 不限房间和gid的订阅放在这个桶键下
+ANY_ROOM = ('any', None)
+
+
+def to_minutes(value):
+    """'HH:MM' 或 'YYYY-MM-DD HH:MM:SS' -> 当天的分钟数"""
+    clock = value[11:16] if len(value) > 10 else value
+    hours, minutes = clock.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_clock(value):
+    """命令行的 'HH:MM' -> 当天的分钟数 (00:00-24:00)，格式不对时抛出ValueError"""
+    hours, _, minutes = value.strip().partition(':')
+    if not (hours.isdigit() and minutes.isdigit() and len(minutes) == 2):
+        raise ValueError(f'expected HH:MM: {value}')
+    total = int(hours) * 60 + int(minutes)
+    if int(minutes) >= 60 or total > 24 * 60:
+        raise ValueError(f'not a time of day: {value}')
+    return total
+
+
+def parse_weekday(value):
+    """'thu' / 'Thursday' / '3' -> 0-6 (星期一为0)"""
+    value = str(value).strip().lower()
+    if value.isdigit() and int(value) < 7:
+        return int(value)
+    for index, name in enumerate(WEEKDAYS):
+        if value.startswith(name):
+            return index
+    raise ValueError(f'unknown weekday: {value}')
+
+
+def write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class Subscription:
+    """一条订阅：gids/space_ids为空表示不限；weekday和date二选一；时间段为 [start, end) 分钟"""
+
+    __slots__ = ('id', 'name', 'gids', 'space_ids', 'weekday', 'date', 'start', 'end', 'webhook')
+
+    def __init__(self, id, start, end, gids=(), space_ids=(), weekday=None, date=None, name='', webhook=None):
+        self.id = id
+        self.name = name
+        self.gids = frozenset(gids)
+        self.space_ids = frozenset(space_ids)
+        self.weekday = weekday
+        self.date = date
+        self.start = start
+        self.end = end
+        self.webhook = webhook
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['id'], to_minutes(data['from']), to_minutes(data['to']),
+            data.get('gids') or (), data.get('space_ids') or (),
+            data.get('weekday'), data.get('date'), data.get('name', ''), data.get('webhook'),
+        )
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'gids': sorted(self.gids),
+            'space_ids': sorted(self.space_ids),
+            'weekday': self.weekday,
+            'date': self.date,
+            'from': f'{self.start // 60:02d}:{self.start % 60:02d}',
+            'to': f'{self.end // 60:02d}:{self.end % 60:02d}',
+            'webhook': self.webhook,
+        }
+
+    def describe(self):
+        rooms = ', '.join(map(str, sorted(self.space_ids))) or ', '.join(map(str, sorted(self.gids))) or 'any room'
+        day = self.date or WEEKDAYS[self.weekday]
+        window = self.as_dict()
+        return f"#{self.id} {self.name or rooms} {day} {window['from']}-{window['to']}"
+
+
+class SubscriptionIndex:
+    """按 (房间/gid, 星期几) 和 (房间/gid, 日期) 分桶的区间索引，桶内按开始时间排序"""
+
+    def __init__(self, subscriptions):
+        buckets = {}
+        for subscription in subscriptions:
+            # 指定了房间的订阅只按房间分桶 (房间换了gid也能匹配)，否则按gid
+            if subscription.space_ids:
+                targets = [('room', space_id) for space_id in subscription.space_ids]
+            else:
+                targets = [('gid', gid) for gid in subscription.gids] or [ANY_ROOM]
+            day = ('date', subscription.date) if subscription.date else ('weekday', subscription.weekday)
+            for target in targets:
+                buckets.setdefault((target, day), []).append(subscription)
+
+        # 每个桶: (开始时间列表, 订阅列表, 最长时间段)；开始时间早于 slot_start - 最长时间段 的订阅不可能重叠
+        self._buckets = {}
+        for key, members in buckets.items():
+            members.sort(key=lambda subscription: subscription.start)
+            self._buckets[key] = (
+                [subscription.start for subscription in members],
+                members,
+                max(subscription.end - subscription.start for subscription in members),
+            )
+        self.size = len(subscriptions)
+
+    def match(self, space_id, gid, start_time, end_time):
+        """和这个时间槽重叠的订阅"""
+        date = start_time[:10]
+        weekday = datetime.strptime(date, '%Y-%m-%d').weekday()
+        slot_start, slot_end = to_minutes(start_time), to_minutes(end_time)
+        if slot_end <= slot_start:
+            slot_end = 24 * 60
+
+        matches = []
+        for target in (('room', space_id), ('gid', gid), ANY_ROOM):
+            for day in (('date', date), ('weekday', weekday)):
+                bucket = self._buckets.get((target, day))
+                if bucket is None:
+                    continue
+                starts, members, longest = bucket
+                lo = bisect_right(starts, slot_start - longest)
+                hi = bisect_left(starts, slot_end)
+                matches.extend(subscription for subscription in members[lo:hi] if subscription.end > slot_start)
+        return matches
+
+
+class FileSink:
+    """每条通知追加一行JSON到通知文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, notifications):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for notification in notifications:
+                f.write(json.dumps(notification, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """把通知POST到订阅里的webhook地址，失败只打印，不影响其他通知"""
+
+    def send(self, notifications):
+        import requests
+        for notification in notifications:
+            try:
+                response = requests.post(notification['webhook'], json=notification, timeout=WEBHOOK_TIMEOUT)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"Webhook for subscription #{notification['subscription']} failed: {e}")
+
+
+class SlotWatcher:
+    """保存订阅和已处理到的数据库版本，每次检查处理新发布版本的变更日志"""
+
+    def __init__(self, db_name=DEFAULT_DB, watch_dir=DEFAULT_WATCH_DIR):
+        self.db_name = db_name
+        self.watch_dir = watch_dir
+        os.makedirs(watch_dir, exist_ok=True)
+        self.subscriptions = [
+            Subscription.from_dict(data)
+            for data in read_json(os.path.join(watch_dir, SUBSCRIPTIONS_NAME), [])
+        ]
+        self.state = read_json(os.path.join(watch_dir, STATE_NAME), {'version': None})
+        self.file_sink = FileSink(os.path.join(watch_dir, NOTIFICATIONS_NAME))
+        self.webhook_sink = WebhookSink()
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = SubscriptionIndex(self.subscriptions)
+        return self._index
+
+    def _save_subscriptions(self):
+        write_json(os.path.join(self.watch_dir, SUBSCRIPTIONS_NAME), [s.as_dict() for s in self.subscriptions])
+        self._index = None
+
+    def add(self, subscription_args):
+        """添加订阅，返回新订阅"""
+        next_id = max((subscription.id for subscription in self.subscriptions), default=0) + 1
+        subscription = Subscription(next_id, **subscription_args)
+        if subscription.end <= subscription.start:
+            raise ValueError('the end of the time range must be after its start')
+        if (subscription.weekday is None) == (subscription.date is None):
+            raise ValueError('give either a weekday or a date')
+        self.subscriptions.append(subscription)
+        self._save_subscriptions()
+        return subscription
+
+    def remove(self, subscription_id):
+        count = len(self.subscriptions)
+        self.subscriptions = [s for s in self.subscriptions if s.id != subscription_id]
+        self._save_subscriptions()
+        return len(self.subscriptions) < count
+
+    def _freed_slots(self, conn, last, version):
+        """last之后变为可预约、到version时仍然可预约的未来时间槽；变更日志不完整时返回None
+        
+        每个时间槽只看这段版本中的第一次和最后一次变化：最后的状态是available、最初不是available才算空出，
+        中间空出又被订走的不算
+        """
+        oldest = conn.execute('SELECT MIN(version) FROM refresh_log').fetchone()[0]
+        if oldest is None or oldest > last + 1:
+            return None
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return conn.execute('''
+            SELECT space_id, gid, start_time, end_time, version
+            FROM (
+                SELECT space_id, gid, start_time, end_time, version, new_status,
+                       FIRST_VALUE(old_status) OVER (PARTITION BY space_id, start_time ORDER BY version, id) AS first_status,
+                       ROW_NUMBER() OVER (PARTITION BY space_id, start_time ORDER BY version DESC, id DESC) AS newest
+                FROM slot_changes
+                WHERE version > ? AND version <= ? AND start_time >= ?
+            )
+            WHERE newest = 1 AND new_status = 'available' AND (first_status IS NULL OR first_status != 'available')
+            ORDER BY start_time, space_id
+        ''', (last, version, now)).fetchall()
+
+    def check(self):
+        """处理上次检查之后发布的版本，返回 (版本, 变化的时间槽数, 通知数, 秒)"""
+        start = time.perf_counter()
+        with get_read_pool(self.db_name).snapshot() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            last = self.state['version']
+            # 第一次运行只记下当前版本，不为已经存在的空闲时间发通知
+            if last is None or version <= last:
+                freed = []
+            else:
+                freed = self._freed_slots(conn, last, version)
+                if freed is None:
+                    print(f"Change log no longer covers version {last}; skipping to version {version}")
+                    freed = []
+            rooms = {space_id: room_name for space_id, room_name in conn.execute('SELECT space_id, room_name FROM rooms')}
+
+        # 同一订阅在一次检查中的所有匹配合并成一条通知
+        matched = {}
+        index = self.index
+        for space_id, gid, start_time, end_time, slot_version in freed:
+            for subscription in index.match(space_id, gid, start_time, end_time):
+                matched.setdefault(subscription.id, (subscription, []))[1].append({
+                    'space_id': space_id,
+                    'room_name': rooms.get(space_id, str(space_id)),
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'version': slot_version,
+                })
+
+        notifications = [{
+            'subscription': subscription.id,
+            'name': subscription.name,
+            'description': subscription.describe(),
+            'version': version,
+            'webhook': subscription.webhook,
+            'slots': slots,
+        } for subscription, slots in matched.values()]
+        if notifications:
+            self.file_sink.send(notifications)
+            self.webhook_sink.send([n for n in notifications if n['webhook']])
+
+        if version != last:
+            self.state = {'version': version}
+            write_json(os.path.join(self.watch_dir, STATE_NAME), self.state)
+        return version, len(freed), len(notifications), time.perf_counter() - start
+
+    def run(self, interval=DEFAULT_INTERVAL, once=False):
+        print(f"Watching {self.db_name} for {len(self.subscriptions)} subscriptions "
+              f"(notifications: {self.file_sink.path})")
+        while True:
+            try:
+                version, freed, sent, seconds = self.check()
+            except sqlite3.Error as e:
+                print(f"Failed to read the change log: {e}")
+            else:
+                if freed:
+                    print(f"Version {version}: {freed} slots freed up, {sent} notifications sent ({seconds:.3f}s)")
+            if once:
+                return
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Notify when watched study rooms free up')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--dir', default=DEFAULT_WATCH_DIR, help='subscriptions, state and notifications file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='add a subscription')
+    add.add_argument('--gid', type=int, action='append', default=[], help='room type (repeatable)')
+    add.add_argument('--room', action='append', default=[], help='room ID or name, e.g. "GSR 2D" (repeatable)')
+    day = add.add_mutually_exclusive_group(required=True)
+    day.add_argument('--weekday', type=parse_weekday, help='e.g. thu')
+    day.add_argument('--date', help='YYYY-MM-DD')
+    add.add_argument('--from', dest='start', type=parse_clock, required=True, help='HH:MM')
+    add.add_argument('--to', dest='end', type=parse_clock, required=True, help='HH:MM')
+    add.add_argument('--name', default='')
+    add.add_argument('--webhook', help='URL to POST notifications to (also written to the notifications file)')
+
+    commands.add_parser('list', help='list subscriptions')
+    remove = commands.add_parser('remove', help='remove a subscription')
+    remove.add_argument('id', type=int)
+
+    run = commands.add_parser('run', help='watch for refreshes')
+    run.add_argument('--interval', type=int, default=DEFAULT_INTERVAL, help='seconds between checks')
+    run.add_argument('--once', action='store_true', help='check once and exit')
+    args = parser.parse_args()
+
+    watcher = SlotWatcher(args.db, args.dir)
+    if args.command == 'add':
+        space_ids = []
+        for room in args.room:
+            if room.isdigit():
+                space_ids.append(int(room))
+                continue
+            from room_search import search_rooms
+            rooms = search_rooms(room, limit=1)
+            if not rooms:
+                print(f"No room matches {room!r}")
+                return
+            print(f"{room!r} -> {rooms[0].room_name} ({rooms[0].space_id})")
+            space_ids.append(rooms[0].space_id)
+        try:
+            subscription = watcher.add({
+                'start': args.start, 'end': args.end,
+                'gids': args.gid, 'space_ids': space_ids,
+                'weekday': args.weekday, 'date': args.date,
+                'name': args.name, 'webhook': args.webhook,
+            })
+        except ValueError as e:
+            print(f"Invalid subscription: {e}")
+            return
+        print(f"Added subscription {subscription.describe()}")
+    elif args.command == 'list':
+        for subscription in watcher.subscriptions:
+            print(subscription.describe() + (f" -> {subscription.webhook}" if subscription.webhook else ''))
+    elif args.command == 'remove':
+        print('Removed' if watcher.remove(args.id) else f'No subscription #{args.id}')
+    else:
+        try:
+            watcher.run(args.interval, args.once)
+        except KeyboardInterrupt:
+            print("\nStopping slot watcher...")
+
+
+if __name__ == '__main__':
+    main()
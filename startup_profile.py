@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时分析：用 python -X importtime 统计导入各模块的时间
+
+分析导入:  python startup_profile.py [模块名, 默认app] [--top 20]
+检查预算:  python startup_profile.py --check
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# import app 允许的最长时间 (秒)，取多次测量中最快的一次
+STARTUP_BUDGET_SECONDS = 0.75
+# 启动时不应该被导入的重模块 (只在真正需要时才加载)
+DEFERRED_MODULES = {
+    'app': ('pandas', 'requests', 'script'),
+    'script': ('requests',),
+}
+
+
+def run_python(code, *flags):
+    """在新的解释器中执行代码，返回 (耗时, 进程结果)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, result
+
+
+def profile_imports(module):
+    """返回 [(累计微秒, 自身微秒, 模块名)]，按累计时间从大到小排序"""
+    _, result = run_python(f'import {module}', '-X', 'importtime')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows
+
+
+def measure_import(module, runs=3):
+    """多次在新进程中导入模块，返回最快的一次耗时 (秒)"""
+    code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+    timings = []
+    for _ in range(runs):
+        _, result = run_python(code)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def loaded_modules(module, candidates):
+    """导入module之后，candidates中哪些已经被真正加载 (懒加载占位不算)"""
+    code = (
+        f'import sys, {module}\n'
+        f'for name in {list(candidates)!r}:\n'
+        f'    m = sys.modules.get(name)\n'
+        f'    if m is not None and type(m).__name__ != "_LazyModule":\n'
+        f'        print(name)\n'
+    )
+    _, result = run_python(code)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stdout.split()
+
+
+def check_budget(budget=STARTUP_BUDGET_SECONDS):
+    """检查启动预算，全部通过返回True"""
+    ok = True
+    for module, deferred in DEFERRED_MODULES.items():
+        eager = loaded_modules(module, deferred)
+        if eager:
+            print(f"❌ import {module} eagerly loads: {', '.join(eager)}")
+            ok = False
+        else:
+            print(f"✅ import {module} defers: {', '.join(deferred)}")
+
+    elapsed = measure_import('app')
+    if elapsed > budget:
+        print(f"❌ import app took {elapsed:.3f}s (budget {budget:.2f}s)")
+        ok = False
+    else:
+        print(f"✅ import app took {elapsed:.3f}s (budget {budget:.2f}s)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile and check import-time startup cost')
+    parser.add_argument('module', nargs='?', default='app')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--check', action='store_true', help='enforce the startup budget (non-zero exit if over)')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_budget(args.budget) else 1)
+
+    rows = profile_imports(args.module)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in rows[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
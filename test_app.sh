@@ -41,12 +41,20 @@ else
     echo "❌ Launcher failed to start"
 fi
 
+# Check startup budget
+echo ""
+echo "⏱️  Checking startup budget..."
+if ! python3 startup_profile.py --check; then
+    echo "❌ Startup budget exceeded (run: python3 startup_profile.py app)"
+    startup_ok=false
+fi
+
 # Check required files
 echo ""
 echo "📁 Checking required files..."
-required_files=("app.py" "script.py" "launcher.py" "uoft_study_rooms.csv")
+required_files=("app.py" "script.py" "room_catalog.py" "launcher.py" "uoft_study_rooms.csv")
 
-all_good=true
+all_good=${startup_ok:-true}
 for file in "${required_files[@]}"; do
     if [ -f "$file" ]; then
         echo "✅ $file exists"